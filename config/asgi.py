@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve with a single worker so the live event stream (/events/) sees every
+order update, e.g. ``uvicorn config.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -43,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'pos.middleware.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pos.middleware.DeviceTokenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,13 +76,70 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuned for several tills writing while the kitchen and manager screens
+# read: WAL lets readers carry on during a write, and IMMEDIATE transactions
+# take the write lock at BEGIN so concurrent writers queue on the busy timeout
+# instead of failing with "database is locked" when a read upgrades to a write.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # POS_DB_PATH lets a second instance (e.g. a local head office) run beside a branch
+        'NAME': os.environ.get('POS_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+        # On disk, so tests run with the same locking as production
+        'TEST': {'NAME': BASE_DIR / 'test-db.sqlite3'},
     }
 }
 
+# PostgreSQL, configured from the environment (POS_DB_ENGINE=postgres).
+# By default connections come from psycopg's native pool (pip install
+# "psycopg[pool]"), POS_DB_POOL_MAX of them. POS_DB_POOL_MAX=0 turns the pool
+# off and then CONN_MAX_AGE defaults to 0, a connection per request: the app
+# is served under ASGI, where each request runs its queries on a different
+# thread, so persistent connections are never reused and only pile up until
+# Postgres runs out of slots. POS_DB_REPLICA_HOST adds a 'replica' alias
+# that the read-only screens use (see pos/routers.py).
+if os.environ.get('POS_DB_ENGINE') == 'postgres':
+    def _postgres(host):
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POS_DB_NAME', 'bubloo'),
+            'USER': os.environ.get('POS_DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POS_DB_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('POS_DB_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        pool_max = int(os.environ.get('POS_DB_POOL_MAX', 20))
+        if pool_max:
+            # The pool owns connection lifetime, so CONN_MAX_AGE must stay 0
+            database['CONN_MAX_AGE'] = 0
+            database['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('POS_DB_POOL_MIN', 2)),
+                'max_size': pool_max,
+                'timeout': int(os.environ.get('POS_DB_POOL_TIMEOUT', 10)),
+            }
+        else:
+            database['CONN_MAX_AGE'] = int(os.environ.get('POS_DB_CONN_MAX_AGE', 0))
+        return database
+
+    DATABASES = {'default': _postgres(os.environ.get('POS_DB_HOST', 'localhost'))}
+    if os.environ.get('POS_DB_REPLICA_HOST'):
+        DATABASES['replica'] = _postgres(os.environ['POS_DB_REPLICA_HOST'])
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['pos.routers.ReplicaRouter']
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -121,3 +180,50 @@ STATIC_URL = 'static/'
 # Add these for user-uploaded images (Menu Photos)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Request metrics (pos.middleware). Requests running more queries than the
+# budget are logged to 'pos.metrics'; /metrics is open to staff or to a
+# scraper sending "Authorization: Bearer <POS_METRICS_TOKEN>".
+POS_QUERY_BUDGET = int(os.environ.get('POS_QUERY_BUDGET', 20))
+POS_METRICS_TOKEN = os.environ.get('POS_METRICS_TOKEN', '')
+
+# Completed and cancelled orders older than this are moved to the archive
+# tables by "manage.py archive_orders"; reports read both through pos_order_history.
+POS_ARCHIVE_AFTER_DAYS = int(os.environ.get('POS_ARCHIVE_AFTER_DAYS', 180))
+
+# Print stations (pos.printing, run "manage.py print_worker"). Kitchen tickets
+# are split by category: a station prints the categories it lists and
+# POS_DEFAULT_STATION prints the rest. "device" is a file or printer device
+# (e.g. /dev/usb/lp0) or tcp://host:9100 for a network printer; "format" is
+# escpos or text.
+POS_STATIONS = {
+    'kitchen': {
+        'device': os.environ.get('POS_PRINTER_KITCHEN', os.path.join(BASE_DIR, 'spool', 'kitchen.prn')),
+        'format': 'escpos',
+    },
+    'bar': {
+        'device': os.environ.get('POS_PRINTER_BAR', os.path.join(BASE_DIR, 'spool', 'bar.prn')),
+        'format': 'escpos',
+        'categories': ['Drinks'],
+    },
+    'counter': {
+        'device': os.environ.get('POS_PRINTER_COUNTER', os.path.join(BASE_DIR, 'spool', 'counter.prn')),
+        'format': 'escpos',
+    },
+}
+POS_DEFAULT_STATION = 'kitchen'
+POS_RECEIPT_STATION = 'counter'
+
+# Multi-branch sync (pos.sync). Each branch logs its order, shift and expense
+# changes to an outbox and "manage.py sync_branch" ships them to head office's
+# /sync/ingest/ endpoint. Both sides share POS_SYNC_TOKEN.
+POS_BRANCH = os.environ.get('POS_BRANCH', 'main')
+POS_SYNC_URL = os.environ.get('POS_SYNC_URL', '')
+POS_SYNC_TOKEN = os.environ.get('POS_SYNC_TOKEN', '')
+
+# Sessions are read from the cache and written through to the database;
+# users are cached in process (pos.auth). Always-on screens can skip both with
+# a device token ("manage.py create_device_token") on the views listed here.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['pos.auth.CachedModelBackend']
+POS_DEVICE_VIEWS = ('kitchen_dashboard', 'kitchen_all_day', 'table_dashboard', 'event_stream')
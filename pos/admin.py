@@ -1,8 +1,29 @@
 from django.contrib import admin
-from .models import Category, MenuItem, Table, Order, OrderItem
+from .models import BranchRecord, Category, Customer, DeviceToken, MenuItem, Table, Order, OrderItem, PrintJob, SalesRollup
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """For browsing only: orders change through Order.transition and the till,
+    which keep the change log, rollups and shift totals in step; an admin
+    save would skip all of them."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 admin.site.register(Category)
 admin.site.register(MenuItem)
 admin.site.register(Table)
-admin.site.register(Order)
-admin.site.register(OrderItem)
+admin.site.register(Order, ReadOnlyAdmin)
+admin.site.register(OrderItem, ReadOnlyAdmin)
+admin.site.register(SalesRollup)
+admin.site.register(PrintJob)
+admin.site.register(BranchRecord)
+admin.site.register(Customer)
+admin.site.register(DeviceToken)
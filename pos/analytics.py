@@ -0,0 +1,117 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import F, Sum, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from .models import ItemSalesRollup, SalesRollup
+
+try:
+    import pandas as pd
+except ImportError:  # optional: only speeds up pivots
+    pd = None
+
+# dimension -> field on SalesRollup (order-level) or ItemSalesRollup (line-level)
+ORDER_DIMENSIONS = {
+    'day': 'date',
+    'hour': 'hour',
+    'payment_method': 'payment_method',
+    'order_type': 'order_type',
+}
+ITEM_DIMENSIONS = {
+    'category': 'menu_item__category__name',
+    'item': 'menu_item__name',
+}
+DIMENSIONS = (*ORDER_DIMENSIONS, *ITEM_DIMENSIONS)
+
+# Ranges that include today keep changing; older ones only move on a void or a rebuild
+LIVE_CACHE_SECONDS = 60
+PAST_CACHE_SECONDS = 60 * 60
+
+
+def source(dimension, start, end):
+    """(rollup rows in range, grouping field, revenue field) for a dimension."""
+    if dimension in ORDER_DIMENSIONS:
+        return SalesRollup.objects.filter(date__range=(start, end)), ORDER_DIMENSIONS[dimension], 'total_sales'
+    return ItemSalesRollup.objects.filter(date__range=(start, end)), ITEM_DIMENSIONS[dimension], 'revenue'
+
+
+def breakdown(dimension, start, end, top=None):
+    """Revenue grouped by one dimension, aggregated and ranked in the database."""
+    rows, key, _ = source(dimension, start, end)
+    by_revenue = F('revenue').desc()
+
+    if dimension in ORDER_DIMENSIONS:
+        rows = rows.values(key).annotate(
+            order_count=Sum('order_count'),
+            revenue=Sum('total_sales'),
+            cancelled_count=Sum('cancelled_count'),
+            cancelled_amount=Sum('cancelled_amount'),
+            rank=Window(Rank(), order_by=by_revenue),
+        ).order_by(key)
+    elif dimension == 'category':
+        rows = rows.values('menu_item__category', key).annotate(
+            quantity=Sum('quantity'),
+            revenue=Sum('revenue'),
+            rank=Window(Rank(), order_by=by_revenue),
+        ).order_by('rank', key)
+    else:
+        rows = rows.values('menu_item', key, 'menu_item__category', 'menu_item__category__name').annotate(
+            quantity=Sum('quantity'),
+            revenue=Sum('revenue'),
+            rank=Window(Rank(), order_by=by_revenue),
+        ).order_by('rank', key)
+
+    # Ranked in SQL; the cut is made here because filtering on a window over a
+    # GROUP BY isn't supported. Ties at the cut-off are kept.
+    result = []
+    category_counts = Counter()
+    for row in rows:
+        if dimension == 'item':
+            # Best sellers within each category as well as overall. Django
+            # groups by a partitioned window, so this one is numbered here.
+            category_counts[row['menu_item__category']] += 1
+            row['category_rank'] = category_counts[row['menu_item__category']]
+        if not top or row['rank'] <= top:
+            result.append({'key': row.pop(key), **row})
+    return result
+
+
+def pivot(dimension, start, end):
+    """Revenue as a day x dimension matrix, with pandas when it is installed."""
+    rows, key, revenue = source(dimension, start, end)
+    data = [
+        (row['date'].isoformat(), row[key], float(row['revenue']))
+        for row in rows.values('date', key).annotate(revenue=Sum(revenue)).order_by()
+    ]
+
+    if pd is not None:
+        table = pd.DataFrame(data, columns=['date', 'key', 'revenue']).pivot_table(
+            index='date', columns='key', values='revenue', aggfunc='sum', fill_value=0,
+        ).sort_index().sort_index(axis=1).round(2)
+        return {'index': table.index.tolist(), 'columns': table.columns.tolist(), 'values': table.values.tolist()}
+
+    dates = sorted({day for day, _, _ in data})
+    keys = sorted({k for _, k, _ in data})
+    grid = {(day, k): value for day, k, value in data}
+    return {
+        'index': dates,
+        'columns': keys,
+        'values': [[round(grid.get((day, k), 0.0), 2) for k in keys] for day in dates],
+    }
+
+
+def report(dimension, start, end, top=None, by_day=False):
+    """The analytics payload for a range, cached per (range, dimension, options)."""
+    cache_key = f"pos:analytics:{dimension}:{start}:{end}:{top or 0}:{int(by_day)}"
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = {'start': start, 'end': end, 'dimension': dimension}
+        if by_day:
+            payload.update(pivot(dimension, start, end))
+        else:
+            payload['rows'] = breakdown(dimension, start, end, top)
+        timeout = LIVE_CACHE_SECONDS if end >= timezone.localdate() else PAST_CACHE_SECONDS
+        cache.set(cache_key, payload, timeout)
+    return payload
@@ -0,0 +1,104 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.signals import post_delete, post_save
+
+from .models import DeviceToken
+
+# How long a user or device stays cached in this process. A change made
+# through the ORM clears it at once here; other processes see it within this.
+CACHE_SECONDS = 60
+# Far more users and screens than one branch has; past this the least
+# recently used entry goes.
+CACHE_SIZE = 1000
+
+
+class TimedCache:
+    """A small LRU of found objects, each kept for ``seconds``.
+
+    Misses (``load`` returning None) are not stored, so unknown keys such as
+    made-up device tokens cost a query each but can't grow the cache.
+    """
+
+    def __init__(self, seconds, maxsize=CACHE_SIZE):
+        self.seconds = seconds
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                # Each request gets its own copy, so nothing set on it leaks into the next
+                return copy.copy(entry[0])
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            self._entries[key] = (value, now + self.seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return copy.copy(value)
+
+    def clear(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+users = TimedCache(CACHE_SECONDS)
+devices = TimedCache(CACHE_SECONDS)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that keeps session users in process memory.
+
+    Every polled screen otherwise reads its user row on each request.
+    """
+
+    def get_user(self, user_id):
+        return users.get(user_id, lambda: super(CachedModelBackend, self).get_user(user_id))
+
+    async def aget_user(self, user_id):
+        # ModelBackend has its own async lookup; async views would bypass the cache
+        return await sync_to_async(self.get_user)(user_id)
+
+
+def device_user(token):
+    """The user a device token signs in as, or None for an unknown or revoked token."""
+    def load():
+        device = (
+            DeviceToken.objects.select_related('user')
+            .filter(key_hash=DeviceToken.hash(token), revoked=False, user__is_active=True).first()
+        )
+        return device.user if device else None
+    return devices.get(DeviceToken.hash(token), load)
+
+
+def _forget_user(sender, instance, **kwargs):
+    users.clear(instance.pk)
+    devices.clear()
+
+
+def _forget_devices(sender, instance, **kwargs):
+    devices.clear(instance.key_hash)
+
+
+post_save.connect(_forget_user, sender=settings.AUTH_USER_MODEL)
+post_delete.connect(_forget_user, sender=settings.AUTH_USER_MODEL)
+post_save.connect(_forget_devices, sender=DeviceToken)
+post_delete.connect(_forget_devices, sender=DeviceToken)
@@ -0,0 +1,183 @@
+import contextlib
+import io
+import os
+import random
+import runpy
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+
+from .models import MenuItem, Order, OrderItem, Shift, Table
+
+
+@contextlib.contextmanager
+def scratch_database():
+    """A throwaway copy of the configured database for benchmarks.
+
+    SQLite gets a temporary file rather than Django's in-memory test database,
+    so large seeds don't count towards the benchmark's own memory.
+    """
+    workdir = None
+    if connection.vendor == 'sqlite':
+        workdir = tempfile.TemporaryDirectory()
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir.name, 'bench.sqlite3')
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        if workdir:
+            workdir.cleanup()
+
+
+def seed_menu():
+    # populate_menu.py is the canonical fixture: tables, categories and the real menu
+    with contextlib.redirect_stdout(io.StringIO()):
+        runpy.run_path(str(settings.BASE_DIR / 'populate_menu.py'))
+
+
+def order_payload(rng, item_ids, table_ids, lines=None):
+    """A till-shaped place_order payload: a few lines, mostly dine-in, mostly cash."""
+    picked = rng.sample(item_ids, min(lines or rng.randint(1, 6), len(item_ids)))
+    payload = {
+        'cart': [{'id': item_id, 'quantity': rng.randint(1, 3)} for item_id in picked],
+        'payment_method': rng.choices(['cash', 'card', 'online'], weights=[70, 25, 5])[0],
+        'cash_given': '20000',
+    }
+    if rng.random() < 0.35:
+        payload.update(order_type='takeaway', customer_name=rng.choice(['Ali', 'Sara', 'Bilal', 'Ayesha']))
+    else:
+        payload.update(order_type='dine-in', table_id=rng.choice(table_ids))
+    return payload
+
+
+# Share of a day's orders per local hour: lunch and a big dinner rush
+HOURLY_WEIGHTS = {12: 6, 13: 9, 14: 6, 15: 3, 16: 3, 17: 4, 18: 7, 19: 12, 20: 16, 21: 15, 22: 10, 23: 6}
+
+
+@contextlib.contextmanager
+def _explicit_timestamps():
+    fields = [Order._meta.get_field('created_at'), Shift._meta.get_field('start_time')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def seed_history(days=90, orders_per_day=300, seed=1, batch_size=2000):
+    """Synthetic trading history ending yesterday: orders, line items and one shift per day.
+
+    Rollups and shift totals are derived at the end the same way production
+    rebuilds them, so the seeded database looks like one that has been trading.
+    """
+    rng = random.Random(seed)
+    menu = list(MenuItem.objects.values_list('id', 'price'))
+    table_ids = list(Table.objects.values_list('id', flat=True))
+    hours, weights = zip(*HOURLY_WEIGHTS.items())
+    today = timezone.localdate()
+
+    orders, lines = [], []
+
+    def flush():
+        created = Order.objects.bulk_create(orders, batch_size=batch_size)
+        for order, order_lines in zip(created, pending_lines):
+            for line in order_lines:
+                line.order_id = order.id
+                lines.append(line)
+        OrderItem.objects.bulk_create(lines, batch_size=batch_size)
+        orders.clear()
+        pending_lines.clear()
+        lines.clear()
+
+    pending_lines = []
+    with _explicit_timestamps():
+        for offset in range(days, 0, -1):
+            day = today - timedelta(days=offset)
+            opened = timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=11))
+            Shift.objects.create(start_time=opened, end_time=opened + timedelta(hours=13), opening_cash=5000, is_active=False)
+
+            for _ in range(int(orders_per_day * rng.uniform(0.7, 1.3))):
+                hour = rng.choices(hours, weights)[0]
+                created_at = opened.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+                order_lines = [
+                    OrderItem(menu_item_id=item_id, quantity=rng.randint(1, 3), price=price)
+                    for item_id, price in rng.sample(menu, rng.randint(1, 6))
+                ]
+                total = sum((line.price * line.quantity for line in order_lines), Decimal('0'))
+                dine_in = rng.random() < 0.65
+                orders.append(Order(
+                    created_at=created_at,
+                    order_type='dine-in' if dine_in else 'takeaway',
+                    table_id=rng.choice(table_ids) if dine_in else None,
+                    customer_name='' if dine_in else rng.choice(['Ali', 'Sara', 'Bilal', 'Ayesha']),
+                    payment_method=rng.choices(['cash', 'card', 'online'], weights=[70, 25, 5])[0],
+                    status='cancelled' if rng.random() < 0.03 else 'completed',
+                    total_amount=total,
+                    cash_given=total,
+                ))
+                pending_lines.append(order_lines)
+                if len(orders) >= batch_size:
+                    flush()
+        flush()
+
+    quiet = {'stdout': io.StringIO(), 'stderr': io.StringIO()}
+    call_command('rebuild_sales_rollups', **quiet)
+    call_command('reconcile_shifts', '--fix', *[f'--shift={pk}' for pk in Shift.objects.values_list('pk', flat=True)], **quiet)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Recorder:
+    """Collects wall time (ms) and query count per call."""
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = []
+        self.queries = []
+        self.errors = 0
+
+    def merge(self, other):
+        self.timings += other.timings
+        self.queries += other.queries
+        self.errors += other.errors
+
+    @contextlib.contextmanager
+    def measure(self):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        self.timings.append(elapsed * 1000)
+        self.queries.append(len(ctx.captured_queries))
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'count': len(self.timings),
+            'queries': statistics.mean(self.queries) if self.queries else 0,
+            'p50': percentile(self.timings, 50),
+            'p95': percentile(self.timings, 95),
+            'p99': percentile(self.timings, 99),
+        }
+
+    def format(self):
+        s = self.summary()
+        return (f"{s['name']:<20} n={s['count']:<6} queries/req={s['queries']:<6.1f} "
+                f"p50={s['p50']:.2f}ms p95={s['p95']:.2f}ms p99={s['p99']:.2f}ms")
@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import json
+import queue
+import threading
+from collections import deque
+
+from django.db import transaction
+
+HEARTBEAT_SECONDS = 15
+
+
+class EventBroker:
+    """In-process pub/sub for live screens (kitchen, tables, report).
+
+    Events are kept in a short ring buffer so a screen that reconnects with
+    Last-Event-ID only receives what it missed. Subscribers can be async
+    (ASGI) or blocking (WSGI / runserver); both are fed from ``publish``,
+    which may be called from any thread.
+    """
+
+    def __init__(self, history=500):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = (next(self._ids), event_type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for deliver in subscribers:
+            try:
+                deliver(event)
+            except RuntimeError:
+                # The subscriber's event loop has gone away
+                self._subscribers.discard(deliver)
+
+    def _subscribe(self, deliver, last_id):
+        with self._lock:
+            self._subscribers.add(deliver)
+            if last_id is None:
+                return []
+            return [event for event in self._history if event[0] > last_id]
+
+    async def astream(self, last_id=None):
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue()
+
+        def deliver(event):
+            loop.call_soon_threadsafe(pending.put_nowait, event)
+
+        backlog = self._subscribe(deliver, last_id)
+        seen = last_id or 0
+        try:
+            yield 'retry: 3000\n\n'
+            for event in backlog:
+                seen = event[0]
+                yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(pending.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event[0] > seen:
+                    seen = event[0]
+                    yield format_event(event)
+        finally:
+            self._subscribers.discard(deliver)
+
+    def stream(self, last_id=None):
+        pending = queue.SimpleQueue()
+        deliver = pending.put
+        backlog = self._subscribe(deliver, last_id)
+        seen = last_id or 0
+        try:
+            yield 'retry: 3000\n\n'
+            for event in backlog:
+                seen = event[0]
+                yield format_event(event)
+            while True:
+                try:
+                    event = pending.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event[0] > seen:
+                    seen = event[0]
+                    yield format_event(event)
+        finally:
+            self._subscribers.discard(deliver)
+
+
+def format_event(event):
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+broker = EventBroker()
+
+
+def publish(event_type, **data):
+    # Only announce what actually committed
+    transaction.on_commit(lambda: broker.publish(event_type, data))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pos.archive import archivable, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and cancelled orders older than the archive horizon out of the "
+        "live order tables. Run nightly; reports read archived orders through the history views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.POS_ARCHIVE_AFTER_DAYS,
+                            help="Archive horizon in days (default POS_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            count = archivable(before).count()
+            self.stdout.write(f"{count} orders created before {before:%Y-%m-%d %H:%M} would be archived.")
+            return
+        orders, lines = archive_orders(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {orders} orders ({lines} lines) created before {before:%Y-%m-%d %H:%M}."
+        ))
@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from pos.models import MenuItem
+from pos.thumbnails import generate_thumbnails
+
+
+def _init_worker():
+    # Needed when the pool spawns (macOS/Windows) rather than forks
+    django.setup()
+
+
+def _generate(name, force):
+    return name, generate_thumbnails(name, force=force)
+
+
+class Command(BaseCommand):
+    help = "Generate missing menu item thumbnails in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Pool size (default: CPU count)")
+        parser.add_argument('--force', action='store_true', help="Regenerate thumbnails that already exist")
+
+    def handle(self, *args, **options):
+        names = sorted(set(MenuItem.objects.exclude(image='').exclude(image=None).values_list('image', flat=True)))
+        written = failed = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_generate, name, options['force']) for name in names]
+            for future in as_completed(futures):
+                try:
+                    name, count = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Failed: {e}")
+                    continue
+                written += count
+                if count:
+                    self.stdout.write(f"{name}: {count} thumbnails")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} images checked, {written} thumbnails written, {failed} failed."))
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from pos import analytics
+from pos.bench import scratch_database, seed_history, seed_menu
+from pos.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every analytics dimension over a long range on a scratch database seeded with "
+        "synthetic history (365 days x 2740 orders/day is about 1M orders). Fails if any "
+        "uncached query is slower than --max-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--orders-per-day', type=int, default=2740)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--max-ms', type=float, default=500)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            self.stdout.write(f"Seeding {options['days']} days x {options['orders_per_day']} orders...")
+            started = time.perf_counter()
+            seed_history(options['days'], options['orders_per_day'], seed=options['seed'])
+            self.stdout.write(
+                f"Backend: {connection.vendor}, {Order.objects.count()} orders "
+                f"(seeded in {time.perf_counter() - started:.0f}s)"
+            )
+
+            end = timezone.localdate()
+            start = end - timedelta(days=options['days'])
+            cases = [(dimension, False, None) for dimension in analytics.DIMENSIONS]
+            cases += [('item', False, 10), ('hour', True, None), ('category', True, None)]
+
+            self.stdout.write(f"{'query':<26}{'best ms':>10}{'rows':>8}")
+            slow = []
+            for dimension, by_day, top in cases:
+                timings = []
+                for _ in range(options['repeat']):
+                    cache.clear()
+                    t = time.perf_counter()
+                    payload = analytics.report(dimension, start, end, top=top, by_day=by_day)
+                    timings.append((time.perf_counter() - t) * 1000)
+                label = dimension + (' pivot=day' if by_day else '') + (f' top={top}' if top else '')
+                rows = len(payload.get('rows') or payload.get('index'))
+                self.stdout.write(f"{label:<26}{min(timings):>10.1f}{rows:>8}")
+                if min(timings) > options['max_ms']:
+                    slow.append(label)
+
+        if slow:
+            raise CommandError(f"Over {options['max_ms']:.0f}ms: {', '.join(slow)}")
+        self.stdout.write(self.style.SUCCESS(f"All analytics queries under {options['max_ms']:.0f}ms."))
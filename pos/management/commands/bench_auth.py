@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from pos import auth
+from pos.bench import Recorder, scratch_database, seed_menu
+from pos.models import DeviceToken
+
+URL = '/kitchen/all-day.json'
+
+SETUPS = (
+    ('db sessions', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    }),
+    ('cached_db sessions', {}),
+    ('device token', {}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Poll the kitchen all-day endpoint as a logged-in screen with database sessions, "
+        "with cached sessions and users, and with a device token, and compare the cost of "
+        "signing each request in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            user = User.objects.create_user('bench', password='bench')
+
+            for name, overrides in SETUPS:
+                auth.users.clear()
+                auth.devices.clear()
+                with override_settings(**overrides):
+                    client = Client()
+                    if name == 'device token':
+                        client.get(f"/pair/{DeviceToken.issue('bench screen', user)}/")
+                    else:
+                        client.force_login(user)
+                    recorder = Recorder(name)
+                    for _ in range(options['requests']):
+                        with recorder.measure():
+                            response = client.get(URL)
+                        if response.status_code != 200:
+                            recorder.errors += 1
+                self.stdout.write(recorder.format() + (f" errors={recorder.errors}" if recorder.errors else ''))
@@ -0,0 +1,69 @@
+import os
+import random
+import resource
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pos import export
+from pos.bench import scratch_database, seed_menu
+from pos.models import MenuItem, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = "Seed N line items into a scratch database and stream them out, checking peak RSS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5_000_000)
+        parser.add_argument('--items-per-order', type=int, default=5)
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--max-rss', type=float, default=256, help="Fail above this peak RSS (MiB)")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            self.seed(options['items'], options['items_per_order'])
+            before = peak = self.rss()
+
+            start = time.perf_counter()
+            written = 0
+            with open(os.devnull, 'w') as sink:
+                for chunk in export.render_export(options['format'], 'items'):
+                    written += len(chunk)
+                    sink.write(chunk)
+                    peak = max(peak, self.rss())
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Exported {options['items']} line items ({written / 2**20:.0f} MiB {options['format']}) in {elapsed:.1f}s; "
+            f"RSS {before:.0f} MiB before export, {peak:.0f} MiB peak during export"
+        )
+        if peak > options['max_rss']:
+            raise CommandError(f"Peak RSS {peak:.0f} MiB is over the {options['max_rss']:.0f} MiB ceiling")
+
+    def rss(self):
+        # Current resident set (MiB); falls back to the high-water mark off Linux
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def seed(self, total_items, per_order, batch=2000):
+        rng = random.Random(1)
+        menu = list(MenuItem.objects.values_list('id', 'price'))
+        orders_needed = -(-total_items // per_order)
+        written = 0
+        while written < orders_needed:
+            size = min(batch, orders_needed - written)
+            orders = Order.objects.bulk_create(
+                Order(order_type='takeaway', customer_name='Bench', status='completed', total_amount=Decimal('0'))
+                for _ in range(size)
+            )
+            lines = []
+            for order in orders:
+                for item_id, price in rng.sample(menu, per_order):
+                    lines.append(OrderItem(order_id=order.id, menu_item_id=item_id, quantity=1, price=price))
+            OrderItem.objects.bulk_create(lines[:total_items - written * per_order])
+            written += size
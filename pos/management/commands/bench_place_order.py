@@ -0,0 +1,38 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from pos.bench import Recorder, order_payload, scratch_database, seed_menu
+from pos.models import MenuItem, Table
+
+
+class Command(BaseCommand):
+    help = "Benchmark place_order (queries and latency per order) against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=12, help="Cart lines per order")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            self.run_bench(options)
+
+    def run_bench(self, options):
+        rng = random.Random(options['seed'])
+        item_ids = list(MenuItem.objects.values_list('id', flat=True))
+        table_ids = list(Table.objects.values_list('id', flat=True))
+        client = Client()
+        recorder = Recorder('place_order')
+
+        for i in range(options['orders']):
+            payload = order_payload(rng, item_ids, table_ids, lines=options['lines'])
+            with recorder.measure():
+                response = client.post('/place-order/', json.dumps(payload), content_type='application/json')
+            if response.status_code != 200:
+                self.stderr.write(f"Order {i} failed: {response.content!r}")
+
+        self.stdout.write(recorder.format())
@@ -0,0 +1,126 @@
+import json
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from pos.bench import Recorder, order_payload, scratch_database, seed_history, seed_menu
+from pos.models import MenuItem, Order, Table
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a service rush against the real views on a scratch copy of the configured database: "
+        "tills placing orders, kitchen screens, and managers polling tables/reports. "
+        "Point DATABASES at PostgreSQL to compare backends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=4)
+        parser.add_argument('--kitchens', type=int, default=2)
+        parser.add_argument('--managers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=20, help="Seconds of rush to replay")
+        parser.add_argument('--history-days', type=int, default=60)
+        parser.add_argument('--orders-per-day', type=int, default=300)
+        parser.add_argument('--think', type=float, default=0.05, help="Mean pause between a screen's requests (s)")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            self.stdout.write(f"Seeding {options['history_days']} days of history...")
+            seed_history(options['history_days'], options['orders_per_day'], seed=options['seed'])
+            User.objects.create_user('bench', password='bench')
+            self.stdout.write(f"Backend: {connection.vendor}, {Order.objects.count()} orders in history")
+            results = self.rush(options)
+        self.report(results, options['duration'])
+
+    # --- Roles ---
+    def till(self, client, rng, stop, record):
+        item_ids = list(MenuItem.objects.values_list('id', flat=True))
+        table_ids = list(Table.objects.values_list('id', flat=True))
+        while not stop.is_set():
+            payload = json.dumps(order_payload(rng, item_ids, table_ids))
+            record('place_order', lambda: client.post('/place-order/', payload, content_type='application/json'))
+            self.pause(rng, stop)
+
+    def kitchen(self, client, rng, stop, record):
+        while not stop.is_set():
+            record('kitchen_dashboard', lambda: client.get('/kitchen/'))
+            # The cook bumps the oldest ticket (looked up outside the measured request)
+            oldest = Order.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True).first()
+            if oldest:
+                record('update_order_status', lambda: client.get(f'/order-status/{oldest}/ready/'))
+            self.pause(rng, stop)
+
+    def manager(self, client, rng, stop, record):
+        while not stop.is_set():
+            record('table_dashboard', lambda: client.get('/tables/'))
+            ready = Order.objects.filter(status='ready').order_by('created_at').values_list('id', flat=True).first()
+            if ready and rng.random() < 0.5:
+                record('settle_order', lambda: client.get(f'/settle-order/{ready}/'))
+            record('sales_dashboard', lambda: client.get('/report/'))
+            self.pause(rng, stop)
+
+    def pause(self, rng, stop):
+        if self.think:
+            stop.wait(rng.expovariate(1 / self.think))
+
+    # --- Harness ---
+    def rush(self, options):
+        self.think = options['think']
+        stop = threading.Event()
+        recorders = []
+        roles = ([self.till] * options['tills'] + [self.kitchen] * options['kitchens']
+                 + [self.manager] * options['managers'])
+
+        def worker(role, seed):
+            local = {}
+
+            def record(name, call):
+                recorder = local.setdefault(name, Recorder(name))
+                try:
+                    with recorder.measure():
+                        response = call()
+                except Exception as e:
+                    recorder.errors += 1
+                    self.stderr.write(f"{name}: {e}")
+                    return None
+                if response.status_code >= 400:
+                    recorder.errors += 1
+                return response
+
+            client = Client()
+            client.force_login(User.objects.get(username='bench'))
+            try:
+                role(client, random.Random(seed), stop, record)
+            finally:
+                recorders.append(local)
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(role, options['seed'] + i)) for i, role in enumerate(roles)]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        merged = {}
+        for local in recorders:
+            for name, recorder in local.items():
+                merged.setdefault(name, Recorder(name)).merge(recorder)
+        return merged
+
+    def report(self, results, duration):
+        self.stdout.write(f"{'endpoint':<22}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+        for name in sorted(results):
+            s = results[name].summary()
+            self.stdout.write(
+                f"{name:<22}{s['count'] / duration:>8.1f}{s['p50']:>9.2f}{s['p95']:>9.2f}{s['p99']:>9.2f}"
+                f"{s['queries']:>9.1f}{results[name].errors:>8}"
+            )
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from pos.bench import Recorder, order_payload, scratch_database, seed_history, seed_menu
+from pos.models import MenuItem, Table
+
+SCREENS = (
+    ('kitchen_dashboard', '/kitchen/'),
+    ('table_dashboard', '/tables/'),
+    ('sales_dashboard', '/report/'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Poll the kitchen, tables and report screens from many simulated displays, "
+        "once through the WSGI handler with a fixed thread pool and once through the "
+        "ASGI handler on a single event loop, in the same process. Both arms run the "
+        "current async views: under WSGI Django wraps each one in async_to_sync, as it "
+        "would in a WSGI deployment. This compares the two servers for today's views; "
+        "it is not a measurement against the earlier sync views, which no longer exist."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--screens', type=int, default=200, help="Displays polling at once")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between a display's polls")
+        parser.add_argument('--duration', type=float, default=15)
+        parser.add_argument('--history-days', type=int, default=30)
+        parser.add_argument('--orders-per-day', type=int, default=300)
+        parser.add_argument('--open-orders', type=int, default=40, help="Pending orders on the screens")
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_menu()
+            self.stdout.write(f"Seeding {options['history_days']} days of history...")
+            seed_history(options['history_days'], options['orders_per_day'], seed=options['seed'])
+            self.open_orders(options['open_orders'], options['seed'])
+            self.user = User.objects.create_user('bench', password='bench')
+
+            modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+            for mode in modes:
+                results = asyncio.run(self.run(mode, options))
+                self.report(mode, results, options)
+
+    def open_orders(self, count, seed):
+        rng = random.Random(seed)
+        item_ids = list(MenuItem.objects.values_list('id', flat=True))
+        table_ids = list(Table.objects.values_list('id', flat=True))
+        client = Client()
+        for _ in range(count):
+            client.post('/place-order/', json.dumps(order_payload(rng, item_ids, table_ids)),
+                        content_type='application/json')
+
+    async def run(self, mode, options):
+        if mode == 'wsgi':
+            # Requests wait for one of --threads workers, like a threaded WSGI server
+            pool = ThreadPoolExecutor(options['threads'])
+            self.local = threading.local()
+            loop = asyncio.get_running_loop()
+
+            async def get(url):
+                return await loop.run_in_executor(pool, self.thread_get, url)
+        else:
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            get = client.get
+
+        recorders = {name: Recorder(name) for name, _ in SCREENS}
+        deadline = time.perf_counter() + options['duration']
+        rng = random.Random(options['seed'])
+        screens = itertools.cycle(SCREENS)
+
+        async def display(name, url, offset):
+            await asyncio.sleep(offset)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await get(url)
+                    if response.status_code >= 400:
+                        recorders[name].errors += 1
+                except Exception as e:
+                    recorders[name].errors += 1
+                    self.stderr.write(f"{name}: {e}")
+                elapsed = time.perf_counter() - start
+                recorders[name].timings.append(elapsed * 1000)
+                await asyncio.sleep(max(0, options['interval'] - elapsed))
+
+        await asyncio.gather(*[
+            display(*next(screens), rng.uniform(0, options['interval']))
+            for _ in range(options['screens'])
+        ])
+        if mode == 'wsgi':
+            pool.shutdown()
+        return recorders
+
+    def thread_get(self, url):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+            client.force_login(self.user)
+        return client.get(url)
+
+    def report(self, mode, results, options):
+        polls = options['screens'] * options['duration'] / options['interval']
+        self.stdout.write(f"\n{mode.upper()}: {options['screens']} screens every {options['interval']}s"
+                          + (f", {options['threads']} threads, async views via async_to_sync" if mode == 'wsgi'
+                             else ", one event loop"))
+        self.stdout.write(f"{'screen':<20}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        served = 0
+        for name in sorted(results):
+            s = results[name].summary()
+            served += s['count']
+            self.stdout.write(
+                f"{name:<20}{s['count'] / options['duration']:>8.1f}{s['p50']:>9.2f}{s['p95']:>9.2f}"
+                f"{s['p99']:>9.2f}{results[name].errors:>8}"
+            )
+        self.stdout.write(f"polls served on schedule: {min(served / polls, 1):.0%}")
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from pos.models import DeviceToken
+
+
+class Command(BaseCommand):
+    help = "Issue a one-time pairing link that signs a kitchen display or manager tablet in for good."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='e.g. "Kitchen screen 1"')
+        parser.add_argument('--user', required=True, help="Username the screen signs in as")
+        parser.add_argument('--revoke', action='store_true', help="Revoke every token with this name instead")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f"No user {options['user']!r}.")
+        if options['revoke']:
+            tokens = list(DeviceToken.objects.filter(name=options['name'], user=user, revoked=False))
+            for device in tokens:
+                device.revoked = True
+                device.save(update_fields=['revoked'])
+            self.stdout.write(f"Revoked {len(tokens)} token(s).")
+            return
+        code = DeviceToken.issue(options['name'], user)
+        minutes = int(DeviceToken.PAIRING_WINDOW.total_seconds() // 60)
+        self.stdout.write(f"Pairing link for {options['name']} (works once, for {minutes} minutes):")
+        self.stdout.write(f"  /pair/{code}/   or /pair/{code}/?next=/tables/ for the tables screen")
+        self.stdout.write("Open it on the screen; the browser keeps the device token as a cookie.")
@@ -0,0 +1,43 @@
+import resource
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pos import export
+from pos.utils import parse_date
+
+
+class Command(BaseCommand):
+    help = "Stream orders or line items to CSV / columnar NDJSON with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First local date (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last local date, inclusive (YYYY-MM-DD)")
+        parser.add_argument('--status', action='append', help="Only these statuses (repeatable)")
+        parser.add_argument('--kind', choices=sorted(export.COLUMNS), default='items')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--report-rss', action='store_true', help="Print peak RSS to stderr when done")
+
+    def handle(self, *args, **options):
+        start, end = parse_date(options['start']), parse_date(options['end'])
+        if (options['start'] and not start) or (options['end'] and not end):
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        chunks = export.render_export(
+            options['format'], options['kind'], chunk_size=options['chunk_size'],
+            start=start, end=end, statuses=options['status'],
+        )
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+
+        if options['report_rss']:
+            # ru_maxrss is KiB on Linux
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.stderr.write(f"Peak RSS: {peak:.1f} MiB")
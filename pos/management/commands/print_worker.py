@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pos import printing
+
+
+class Command(BaseCommand):
+    help = "Print queued kitchen tickets and receipts to the stations in POS_STATIONS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help="Jobs taken per round")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Print what is due and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            printed, failed = printing.run_once(options['batch_size'])
+            if printed or failed:
+                self.stdout.write(f"printed {printed}, failed {failed}")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+
+from pos.models import ItemSalesRollup, OrderHistory, OrderItemHistory, SalesRollup
+
+
+def live_buckets():
+    """Aggregate completed/cancelled orders straight from the live and archived orders."""
+    rows = (
+        OrderHistory.objects.filter(status__in=SalesRollup.TRACKED_STATUSES)
+        .annotate(date=TruncDate('created_at'), hour=ExtractHour('created_at'))
+        .values('date', 'hour', 'payment_method', 'order_type', 'status')
+        .annotate(count=Count('id'), amount=Sum('total_amount'))
+        .order_by()
+    )
+    buckets = defaultdict(dict)
+    for row in rows:
+        key = (row['date'], row['hour'], row['payment_method'], row['order_type'])
+        count_field, amount_field = SalesRollup.TRACKED_STATUSES[row['status']]
+        buckets[key][count_field] = row['count']
+        buckets[key][amount_field] = row['amount']
+    return buckets
+
+
+def live_item_buckets():
+    """Completed line items per (local date, menu item), straight from the order lines."""
+    rows = ItemSalesRollup.line_totals(
+        OrderItemHistory.objects.filter(order__status='completed')
+        .annotate(date=TruncDate('order__created_at'))
+        .values('date', 'menu_item')
+    )
+    return {
+        (row['date'], row['menu_item']): {'quantity': row['line_quantity'], 'revenue': row['line_revenue']}
+        for row in rows
+    }
+
+
+def daily_totals(*bucket_sets):
+    # Order and item buckets use distinct field names, so they share one per-day dict
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    for buckets in bucket_sets:
+        for (date, *_), fields in buckets.items():
+            for field, value in fields.items():
+                totals[date][field] += value
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild SalesRollup from order history, or --check it against a live aggregate."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only compare rollups with live totals")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        buckets = live_buckets()
+        item_buckets = live_item_buckets()
+
+        if not options['check']:
+            with transaction.atomic():
+                SalesRollup.objects.all().delete()
+                SalesRollup.objects.bulk_create(
+                    [
+                        SalesRollup(date=date, hour=hour, payment_method=payment_method, order_type=order_type, **fields)
+                        for (date, hour, payment_method, order_type), fields in buckets.items()
+                    ],
+                    batch_size=options['batch_size'],
+                )
+                ItemSalesRollup.objects.all().delete()
+                ItemSalesRollup.objects.bulk_create(
+                    [
+                        ItemSalesRollup(date=date, menu_item_id=menu_item_id, **fields)
+                        for (date, menu_item_id), fields in item_buckets.items()
+                    ],
+                    batch_size=options['batch_size'],
+                )
+            self.stdout.write(f"Rebuilt {len(buckets)} rollup buckets and {len(item_buckets)} item buckets.")
+
+        rollup_buckets = {
+            (r.date, r.hour, r.payment_method, r.order_type): {
+                field: getattr(r, field)
+                for pair in SalesRollup.TRACKED_STATUSES.values() for field in pair
+            }
+            for r in SalesRollup.objects.all()
+        }
+        item_rollup_buckets = {
+            (r.date, r.menu_item_id): {'quantity': r.quantity, 'revenue': r.revenue}
+            for r in ItemSalesRollup.objects.all()
+        }
+        expected = daily_totals(buckets, item_buckets)
+        actual = daily_totals(rollup_buckets, item_rollup_buckets)
+        mismatches = 0
+        for date in sorted(set(expected) | set(actual)):
+            for field in set(expected[date]) | set(actual[date]):
+                if expected[date][field] != actual[date][field]:
+                    mismatches += 1
+                    self.stderr.write(f"{date} {field}: live={expected[date][field]} rollup={actual[date][field]}")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} rollup totals differ from the live aggregate.")
+        self.stdout.write(self.style.SUCCESS(f"Rollups match live totals for {len(expected)} days."))
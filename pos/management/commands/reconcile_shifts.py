@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from pos.models import ChangeLog, OrderHistory, Shift
+
+COUNTERS = ('total_sales', 'cash_sales', 'card_sales', 'online_sales', 'order_count', 'total_expenses')
+
+
+def recompute(shift):
+    """Full recompute of a shift's running totals from its orders and expenses.
+
+    Follows Shift.record_order: an order counts towards the shift it was placed
+    in, if it was completed while that shift was still open. Orders completed
+    before status_changed_at existed fall back to their created_at.
+    """
+    orders = OrderHistory.objects.filter(created_at__gte=shift.start_time, status='completed')
+    if shift.end_time:
+        orders = orders.filter(
+            Q(status_changed_at__lt=shift.end_time)
+            | Q(status_changed_at__isnull=True, created_at__lt=shift.end_time)
+        )
+
+    totals = dict.fromkeys(COUNTERS, Decimal('0'))
+    totals['order_count'] = 0
+    for row in orders.values('payment_method').annotate(count=Count('id'), amount=Sum('total_amount')).order_by():
+        totals['total_sales'] += row['amount']
+        totals['order_count'] += row['count']
+        if f"{row['payment_method']}_sales" in totals:
+            totals[f"{row['payment_method']}_sales"] += row['amount']
+    totals['total_expenses'] = shift.expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Check shift running totals against a full recompute (the open shift by default). "
+        "A sale voided after its shift closed stays in that shift's totals but not in the "
+        "recompute, so it shows up as drift there; check before using --fix on a closed shift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shift', type=int, action='append', help="Shift id (repeatable)")
+        parser.add_argument('--fix', action='store_true', help="Overwrite drifted counters with the recomputed values")
+
+    def handle(self, *args, **options):
+        shifts = Shift.objects.filter(pk__in=options['shift']) if options['shift'] else Shift.current()
+        drifted = 0
+        for shift in shifts:
+            expected = recompute(shift)
+            diffs = {field: value for field, value in expected.items() if getattr(shift, field) != value}
+            if not diffs:
+                self.stdout.write(f"{shift}: OK")
+                continue
+
+            drifted += 1
+            for field, value in diffs.items():
+                self.stderr.write(f"{shift}: {field} counter={getattr(shift, field)} recomputed={value}")
+            if options['fix']:
+                if shift.end_time:
+                    # A closed shift's cash count was made against the old totals
+                    fixed = {field: diffs.get(field, getattr(shift, field)) for field in COUNTERS}
+                    diffs['calculated_cash'] = shift.opening_cash + fixed['total_sales'] - fixed['total_expenses']
+                    diffs['difference'] = shift.actual_cash - diffs['calculated_cash']
+                with transaction.atomic():
+                    Shift.objects.filter(pk=shift.pk).update(**diffs)
+                    ChangeLog.capture(Shift.objects.filter(pk=shift.pk))
+                self.stdout.write(f"{shift}: fixed")
+
+        if drifted and not options['fix']:
+            raise CommandError(f"{drifted} shift(s) have drifted counters; rerun with --fix to repair.")
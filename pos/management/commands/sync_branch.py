@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pos.sync import SyncFailed, ship
+
+
+class Command(BaseCommand):
+    help = (
+        "Ship this branch's unsent order, shift and expense changes to head office "
+        "(POS_SYNC_URL). Safe to run from cron as often as you like; offline runs just retry later."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.POS_SYNC_URL, help="Head office /sync/ingest/ URL")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not options['url']:
+            raise CommandError("Set POS_SYNC_URL or pass --url.")
+        try:
+            shipped = ship(options['url'], options['batch_size'])
+        except SyncFailed as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"{settings.POS_BRANCH}: shipped {shipped} changes."))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Category, MenuItem, MenuVersion
+
+
+def get_menu():
+    """The till menu as a cached snapshot, keyed by the current MenuVersion.
+
+    Returns a dict with the version, the category list, the menu as a JSON
+    string and the rendered item grid. A version bump simply makes the old
+    cache key unreachable.
+    """
+    version = MenuVersion.current()
+    key = f'pos:menu:{version}'
+    menu = cache.get(key)
+    if menu is None:
+        menu = build_menu(version)
+        cache.set(key, menu, None)
+    return menu
+
+
+def build_menu(version):
+    categories = [{'id': cat.id, 'name': cat.name} for cat in Category.objects.order_by('id')]
+    menu_items = list(MenuItem.objects.filter(is_available=True).select_related('category').order_by('id'))
+    payload = {
+        'version': version,
+        'categories': categories,
+        'items': [
+            {
+                'id': item.id,
+                'name': item.name,
+                'price': str(item.price),
+                'category_id': item.category_id,
+                'category': item.category.name,
+                'image': item.thumbnail_url or None,
+            }
+            for item in menu_items
+        ],
+    }
+    return {
+        'version': version,
+        'categories': categories,
+        'json': json.dumps(payload),
+        'html': render_to_string('pos/menu_grid.html', {'menu_items': menu_items}),
+    }
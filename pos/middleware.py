@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+from .auth import device_user
+
+logger = logging.getLogger('pos.metrics')
+
+# Upper bounds in seconds / queries; Prometheus histograms are cumulative
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self, name, labels):
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:g}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicate_queries = 0
+        self.over_budget = 0
+
+
+class MetricsRegistry:
+    """Per-URL-name request metrics held in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, duration, db_duration, queries, duplicates, over_budget):
+        with self._lock:
+            metrics = self._views.setdefault(view, ViewMetrics())
+            metrics.duration.observe(duration)
+            metrics.db_duration.observe(db_duration)
+            metrics.queries.observe(queries)
+            metrics.duplicate_queries += duplicates
+            metrics.over_budget += over_budget
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    # (name, type, help, sample lines for one view's ViewMetrics and label string)
+    FAMILIES = (
+        ('pos_request_duration_seconds', 'histogram', 'Wall time per request.',
+         lambda m, name, labels: m.duration.render(name, labels)),
+        ('pos_request_db_seconds', 'histogram', 'Time spent in database queries per request.',
+         lambda m, name, labels: m.db_duration.render(name, labels)),
+        ('pos_request_queries', 'histogram', 'Database queries per request.',
+         lambda m, name, labels: m.queries.render(name, labels)),
+        ('pos_request_duplicate_queries_total', 'counter', 'Queries repeating an earlier statement in the same request.',
+         lambda m, name, labels: [f'{name}{{{labels}}} {m.duplicate_queries}']),
+        ('pos_request_over_query_budget_total', 'counter', 'Requests over POS_QUERY_BUDGET.',
+         lambda m, name, labels: [f'{name}{{{labels}}} {m.over_budget}']),
+    )
+
+    def render(self):
+        # Prometheus text format: each family's samples sit together under its own HELP / TYPE
+        lines = []
+        with self._lock:
+            views = sorted(self._views.items())
+            for name, kind, help_text, samples in self.FAMILIES:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for view, metrics in views:
+                    lines += samples(metrics, name, f'view="{view}"')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryCollector:
+    """connection.execute_wrapper hook: times every query and keeps its SQL signature."""
+
+    def __init__(self):
+        self.signatures = Counter()
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            # Parameters are kept apart from the SQL, so the text is already a signature
+            self.signatures[sql] += 1
+
+    @property
+    def count(self):
+        return sum(self.signatures.values())
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.signatures.items() if n > 1}
+
+
+# The collector for the current request. A context variable rather than a
+# per-connection wrapper, because async views run their queries on whichever
+# thread sync_to_async picks, and context variables follow them there.
+_collector = ContextVar('pos_query_collector', default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    collector = _collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(install)
+
+
+class QueryMetricsMiddleware:
+    """Records wall time, DB time, query count and repeated queries per URL name.
+
+    Served in Prometheus text format at /metrics. Requests that run more than
+    POS_QUERY_BUDGET queries are logged with their repeated statements, which
+    is what an N+1 looks like. Works for sync and async views alike.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        collector = QueryCollector()
+        token = _collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _collector.reset(token)
+        self.observe(request, collector, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        collector = QueryCollector()
+        token = _collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _collector.reset(token)
+        self.observe(request, collector, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, collector, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        duplicates = collector.duplicates()
+        budget = getattr(settings, 'POS_QUERY_BUDGET', 20)
+        over_budget = collector.count > budget
+        registry.observe(view, duration, collector.duration, collector.count,
+                         sum(n - 1 for n in duplicates.values()), int(over_budget))
+
+        if over_budget:
+            worst = sorted(duplicates.items(), key=lambda item: -item[1])[:3]
+            logger.warning(
+                "%s %s ran %d queries (budget %d) in %.0fms; repeated: %s",
+                request.method, request.path, collector.count, budget, duration * 1000,
+                '; '.join(f'{n}x {sql[:120]}' for sql, n in worst) or 'none',
+            )
+
+
+class DeviceTokenMiddleware(MiddlewareMixin):
+    """Signs always-on screens in by device token instead of by session.
+
+    On the views in POS_DEVICE_VIEWS a token in the pos_device cookie (set by
+    the /pair/ link) or an "Authorization: Device <token>" header replaces
+    request.user before anything has touched the lazy session, so the session
+    is never loaded. Tokens are never read from the URL, where they would end
+    up in access logs. Anything else falls back to the normal login.
+    """
+
+    COOKIE = 'pos_device'
+    COOKIE_AGE = 60 * 60 * 24 * 365
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not match or match.url_name not in settings.POS_DEVICE_VIEWS:
+            return None
+        auth = request.headers.get('Authorization', '')
+        token = request.COOKIES.get(self.COOKIE) or (auth[len('Device '):] if auth.startswith('Device ') else None)
+        if not token:
+            return None
+        user = device_user(token)
+        if user is None:
+            return None
+
+        async def auser():
+            return user
+        request.user, request.auser = user, auser
+        return None
+
+    @classmethod
+    def set_cookie(cls, response, token):
+        response.set_cookie(cls.COOKIE, token, max_age=cls.COOKIE_AGE, httponly=True, samesite='Lax')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0006_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Credit/Debit Card'), ('online', 'Online/Wallet')], max_length=10)),
+                ('order_type', models.CharField(choices=[('dine-in', 'Dine-in'), ('takeaway', 'Takeaway')], max_length=10)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'hour', 'payment_method', 'order_type'), name='unique_sales_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0008_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='card_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='cash_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='online_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
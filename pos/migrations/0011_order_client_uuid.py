@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0010_menuversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
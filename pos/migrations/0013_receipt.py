@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0012_order_status_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Receipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bill', 'Bill'), ('invoice', 'Invoice')], max_length=10)),
+                ('html', models.TextField()),
+                ('etag', models.CharField(max_length=64)),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='pos.order')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('order', 'kind'), name='unique_receipt_kind')],
+            },
+        ),
+    ]
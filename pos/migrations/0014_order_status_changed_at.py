@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0013_receipt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status_changed_at', 'id'], name='order_status_changed_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0014_order_status_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pos.menuitem')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'menu_item'), name='unique_item_sales_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ORDER_COLUMNS = (
+    'id, client_uuid, table_id, order_type, payment_method, customer_name, customer_phone, '
+    'cash_given, change_due, status, total_amount, created_at, status_changed_at'
+)
+ITEM_COLUMNS = 'id, order_id, menu_item_id, quantity, price'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0015_itemsalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_uuid', models.UUIDField(blank=True, editable=False, null=True)),
+                ('order_type', models.CharField(choices=[('dine-in', 'Dine-in'), ('takeaway', 'Takeaway')], default='dine-in', max_length=10)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Credit/Debit Card'), ('online', 'Online/Wallet')], default='cash', max_length=10)),
+                ('customer_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('customer_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('cash_given', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('change_due', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('status_changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'pos_order_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItemHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'db_table': 'pos_orderitem_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_uuid', models.UUIDField(blank=True, editable=False, null=True)),
+                ('order_type', models.CharField(choices=[('dine-in', 'Dine-in'), ('takeaway', 'Takeaway')], default='dine-in', max_length=10)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Credit/Debit Card'), ('online', 'Online/Wallet')], default='cash', max_length=10)),
+                ('customer_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('customer_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('cash_given', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('change_due', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('status_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('table', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pos.table')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pos.menuitem')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='pos.archivedorder')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ),
+        migrations.RunSQL(
+            f"CREATE VIEW pos_order_history AS "
+            f"SELECT {ORDER_COLUMNS} FROM pos_order UNION ALL SELECT {ORDER_COLUMNS} FROM pos_archivedorder",
+            "DROP VIEW pos_order_history",
+        ),
+        migrations.RunSQL(
+            f"CREATE VIEW pos_orderitem_history AS "
+            f"SELECT {ITEM_COLUMNS} FROM pos_orderitem UNION ALL SELECT {ITEM_COLUMNS} FROM pos_archivedorderitem",
+            "DROP VIEW pos_orderitem_history",
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0016_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('kot', 'Kitchen Order Ticket'), ('receipt', 'Receipt')], default='kot', max_length=10)),
+                ('station', models.CharField(max_length=30)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('printing', 'Printing'), ('printed', 'Printed'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('printed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='print_jobs', to='pos.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='printjob_due_idx')],
+            },
+        ),
+    ]
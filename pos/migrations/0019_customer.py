@@ -0,0 +1,117 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:36
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Max, Sum, Value, When
+
+OLD_ORDER_COLUMNS = (
+    'id, client_uuid, table_id, order_type, payment_method, customer_name, customer_phone, '
+    'cash_given, change_due, status, total_amount, created_at, status_changed_at'
+)
+ORDER_COLUMNS = OLD_ORDER_COLUMNS + ', customer_id'
+
+BATCH_SIZE = 2000
+
+
+def create_view(columns):
+    return (
+        f"CREATE VIEW pos_order_history AS "
+        f"SELECT {columns} FROM pos_order UNION ALL SELECT {columns} FROM pos_archivedorder"
+    )
+
+
+def normalize_phone(raw):
+    # Customer.normalize_phone as of this migration
+    digits = ''.join(ch for ch in str(raw or '') if ch.isdigit())
+    if digits.startswith('92') and len(digits) == 12:
+        digits = '0' + digits[2:]
+    return digits
+
+
+def backfill_customers(apps, schema_editor):
+    """One Customer per distinct phone on live and archived orders, linked in batches by id."""
+    Customer = apps.get_model('pos', 'Customer')
+    totals = defaultdict(lambda: [0, Decimal('0'), None])
+
+    for model_name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('pos', model_name)
+        with_phone = model.objects.exclude(customer_phone__isnull=True).exclude(customer_phone='').order_by('id')
+        last_id = 0
+        while True:
+            batch = list(with_phone.filter(id__gt=last_id).values_list('id', 'customer_phone', 'customer_name')[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            orders_by_phone, names = defaultdict(list), {}
+            for pk, raw_phone, name in batch:
+                phone = normalize_phone(raw_phone)
+                if phone:
+                    orders_by_phone[phone].append(pk)
+                    if name:
+                        names[phone] = name
+            if not orders_by_phone:
+                continue
+            Customer.objects.bulk_create(
+                [Customer(phone=phone, name=names.get(phone, '')) for phone in orders_by_phone],
+                ignore_conflicts=True,
+            )
+            customer_ids = dict(Customer.objects.filter(phone__in=orders_by_phone).values_list('phone', 'id'))
+            model.objects.filter(id__in=[pk for pks in orders_by_phone.values() for pk in pks]).update(customer_id=Case(
+                *[When(id=pk, then=Value(customer_ids[phone])) for phone, pks in orders_by_phone.items() for pk in pks],
+            ))
+
+        # Running totals as Order.transition would have kept them
+        for row in (
+            model.objects.filter(status='completed', customer__isnull=False)
+            .values('customer').annotate(visits=Count('id'), spend=Sum('total_amount'), last=Max('created_at'))
+            .order_by()
+        ):
+            total = totals[row['customer']]
+            total[0] += row['visits']
+            total[1] += row['spend']
+            total[2] = max(filter(None, (total[2], row['last'])))
+
+    customers = list(Customer.objects.filter(id__in=totals))
+    for customer in customers:
+        customer.visit_count, customer.lifetime_spend, customer.last_order_at = totals[customer.id]
+    Customer.objects.bulk_update(customers, ['visit_count', 'lifetime_spend', 'last_order_at'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0018_branch_sync'),
+    ]
+
+    operations = [
+        # The history view lists Order's columns; rebuilt below with customer_id
+        migrations.RunSQL("DROP VIEW pos_order_history", create_view(OLD_ORDER_COLUMNS)),
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pos.customer'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='pos.customer'),
+        ),
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+        migrations.RunSQL(create_view(ORDER_COLUMNS), "DROP VIEW pos_order_history"),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0020_devicetoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='pairing_expires',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='pairing_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='key_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
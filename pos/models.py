@@ -1,6 +1,21 @@
-from django.db import models
+import hashlib
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.template.loader import render_to_string
 from django.utils import timezone
 
+from . import events
+from .thumbnails import generate_thumbnails, srcset, thumbnail_name
+
 # --- 1. Menu Management ---
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -23,7 +38,46 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.name} - {self.price}"
 
+    def save(self, *args, **kwargs):
+        new_upload = bool(self.image) and not self.image._committed
+        super().save(*args, **kwargs)
+        if new_upload:
+            generate_thumbnails(self.image.name, force=True)
+
+    # Thumbnails (see thumbnails.py); the grid uses these instead of the full upload
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(thumbnail_name(self.image.name, 320, 'jpg')) if self.image else ''
+
+    @property
+    def webp_srcset(self):
+        return srcset(self.image.name, 'webp') if self.image else ''
+
+    @property
+    def jpeg_srcset(self):
+        return srcset(self.image.name, 'jpg') if self.image else ''
+
+class MenuVersion(models.Model):
+    """Single-row counter bumped on every Category / MenuItem change (see signals.py)."""
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Menu v{self.version}"
+
+    @classmethod
+    def current(cls):
+        return cls.objects.values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.update(version=F('version') + 1):
+            cls.objects.create(version=1)
+
 # --- 2. Restaurant Operations ---
+class InvalidTransition(Exception):
+    pass
+
+
 class Table(models.Model):
     name = models.CharField(max_length=50, unique=True)
     status = models.CharField(max_length=20, default='available', choices=[
@@ -35,6 +89,82 @@ class Table(models.Model):
         return self.name
 
 # --- 3. Order Logic ---
+class Customer(models.Model):
+    """A regular, keyed by normalized phone number.
+
+    The visit count, lifetime spend and last visit are running totals kept
+    by Order.transition, like the shift counters, so the till can show them
+    without reading the customer's orders.
+    """
+    phone = models.CharField(max_length=20, unique=True)
+    name = models.CharField(max_length=100, blank=True)
+    visit_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.phone})" if self.name else self.phone
+
+    @staticmethod
+    def normalize_phone(raw):
+        """Digits only, local form: '+92 300-1234567' and '0300 1234567' are both '03001234567'."""
+        digits = ''.join(ch for ch in str(raw or '') if ch.isdigit())
+        if digits.startswith('92') and len(digits) == 12:
+            digits = '0' + digits[2:]
+        return digits
+
+    @classmethod
+    def for_order(cls, phone, name=''):
+        """The customer for a phone number typed at the till, created on first visit."""
+        phone = cls.normalize_phone(phone)
+        if not phone:
+            return None
+        customer, created = cls.objects.get_or_create(phone=phone, defaults={'name': name or ''})
+        if name and not created and customer.name != name:
+            cls.objects.filter(pk=customer.pk).update(name=name)
+        return customer
+
+    @classmethod
+    def search(cls, prefix, limit=10):
+        """Customers whose phone starts with prefix, as a range on the unique index."""
+        prefix = cls.normalize_phone(prefix)
+        if prefix.startswith('92'):
+            prefix = '0' + prefix[2:]  # a local number never starts with 92: this is +92 being typed
+        if not prefix:
+            return cls.objects.none()
+        matches = cls.objects.filter(phone__gte=prefix)
+        # The next prefix up, in digits only so any collation orders it the same: 0399 -> 04
+        stem = prefix.rstrip('9')
+        if stem:
+            matches = matches.filter(phone__lt=stem[:-1] + str(int(stem[-1]) + 1))
+        return matches.order_by('phone')[:limit]
+
+    @classmethod
+    def record_order(cls, order, old_status, new_status):
+        # Completed orders are visits; a voided one is taken back off
+        sign = (new_status == 'completed') - (old_status == 'completed')
+        if not sign or not order.customer_id:
+            return
+        changes = {
+            'visit_count': F('visit_count') + sign,
+            'lifetime_spend': F('lifetime_spend') + sign * order.total_amount,
+        }
+        if sign > 0:
+            changes['last_order_at'] = Greatest(Coalesce('last_order_at', Value(order.created_at)), Value(order.created_at))
+        cls.objects.filter(pk=order.customer_id).update(**changes)
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'phone': self.phone,
+            'visit_count': self.visit_count,
+            'lifetime_spend': str(self.lifetime_spend),
+            'last_order_at': timezone.localtime(self.last_order_at).isoformat(timespec='minutes') if self.last_order_at else None,
+        }
+
+
 class Order(models.Model):
     ORDER_TYPES = (
         ('dine-in', 'Dine-in'),
@@ -48,6 +178,9 @@ class Order(models.Model):
         ('online', 'Online/Wallet'),
     )
 
+    # Generated by the till; makes retries and offline-queue flushes idempotent
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
     table = models.ForeignKey(Table, on_delete=models.SET_NULL, null=True, blank=True)
     order_type = models.CharField(max_length=10, choices=ORDER_TYPES, default='dine-in')
 
@@ -56,18 +189,93 @@ class Order(models.Model):
 
     customer_name = models.CharField(max_length=100, blank=True, null=True)
     customer_phone = models.CharField(max_length=20, blank=True, null=True)
+    # Set when a phone number is given; name and phone above stay as typed on the order
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
 
     # Cash Handling
     cash_given = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     change_due = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
-    status = models.CharField(max_length=20, default='pending')
+    STATUSES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+    )
+    OPEN_STATUSES = ('pending', 'ready')
+    # status -> statuses it may move to; a completed order can still be voided
+    TRANSITIONS = {
+        'pending': ('ready', 'completed', 'cancelled'),
+        'ready': ('completed', 'cancelled'),
+        'completed': ('cancelled',),
+        'cancelled': (),
+    }
+
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set by transition(); the sales report's "changed since" cursor
+    status_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Kitchen queue, shift totals: status = X [AND created_at >= Y] ORDER BY created_at
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Sales report: one local day as a created_at range
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Sales report deltas: status_changed_at > X ORDER BY status_changed_at, id
+            models.Index(fields=['status_changed_at', 'id'], name='order_status_changed_idx'),
+            # Open orders only (a small slice of the table): per-table and takeaway lookups
+            models.Index(fields=['table', 'status'], name='order_open_table_idx', condition=models.Q(status__in=['pending', 'ready'])),
+            models.Index(fields=['order_type', 'created_at'], name='order_open_type_idx', condition=models.Q(status__in=['pending', 'ready'])),
+        ]
 
     def __str__(self):
         return f"Order {self.id} ({self.payment_method})"
 
+    def transition(self, new_status):
+        """Move the order to new_status; raises InvalidTransition if it can't.
+
+        The status itself changes with one conditional UPDATE that only
+        matches while the row still has the status this instance was loaded
+        with, so the kitchen and the cashier can't overwrite each other. The
+        change log, rollups, shift, customer and table are kept in step in the
+        same transaction, a handful of single-row writes with no reads of the
+        order's lines beyond one grouped query. Nothing is rendered here.
+        """
+        old_status = self.status
+        if new_status not in self.TRANSITIONS.get(old_status, ()):
+            raise InvalidTransition(f"Order {self.id} is {old_status} and cannot become {new_status}")
+
+        with transaction.atomic():
+            changed_at = timezone.now()
+            if not Order.objects.filter(pk=self.pk, status=old_status).update(status=new_status, status_changed_at=changed_at):
+                raise InvalidTransition(f"Order {self.id} was changed by someone else")
+            self.status, self.status_changed_at = new_status, changed_at
+            ChangeLog.record(self)
+            SalesRollup.record(self, old_status, new_status)
+            ItemSalesRollup.record(self, old_status, new_status)
+            Shift.record_order(self, old_status, new_status)
+            Customer.record_order(self, old_status, new_status)
+            # Receipts are rendered on their first fetch (see views.receipt_response),
+            # not on the till's settle request; a voided sale drops its stored ones
+            if old_status == 'completed':
+                Receipt.objects.filter(order=self).delete()
+            events.publish('order.status', id=self.id, status=new_status, table_id=self.table_id)
+
+            # Free the table once its last open order closes
+            if self.table_id and new_status not in self.OPEN_STATUSES:
+                freed = (
+                    Table.objects.filter(pk=self.table_id, status='occupied')
+                    .exclude(order__status__in=self.OPEN_STATUSES)
+                    .update(status='available')
+                )
+                if freed:
+                    events.publish('table.freed', id=self.table_id)
+
+    async def atransition(self, new_status):
+        await sync_to_async(self.transition)(new_status)
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -81,6 +289,60 @@ class OrderItem(models.Model):
     def total_price(self):
         return self.quantity * self.price
 
+    @classmethod
+    def all_day(cls, station=None):
+        """Quantity still to cook per menu item, over every pending order, in one grouped query."""
+        lines = cls.objects.filter(order__status='pending')
+        if station:
+            lines = lines.filter(PrintJob.station_q(station))
+        return (
+            lines.values('menu_item', 'menu_item__name', 'menu_item__category__name')
+            .annotate(quantity=Sum('quantity'))
+            .order_by('-quantity', 'menu_item__name')
+        )
+
+class Receipt(models.Model):
+    """A completed order's bill or invoice, rendered once and served as stored."""
+    TEMPLATES = {
+        'bill': 'pos/bill.html',
+        'invoice': 'pos/digital_bill.html',
+    }
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='receipts')
+    kind = models.CharField(max_length=10, choices=[(kind, kind.title()) for kind in TEMPLATES])
+    html = models.TextField()
+    etag = models.CharField(max_length=64)
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'kind'], name='unique_receipt_kind'),
+        ]
+
+    @staticmethod
+    def receipt_order(order_id, model=None):
+        # Everything the receipt templates walk, in three queries however many lines
+        return (
+            (model or Order).objects.select_related('table').prefetch_related('items__menu_item')
+            .filter(id=order_id).first()
+        )
+
+    @classmethod
+    def render(cls, order, kind):
+        return render_to_string(cls.TEMPLATES[kind], {'order': order})
+
+    @classmethod
+    def store(cls, order, kind):
+        html = cls.render(order, kind)
+        receipt, _ = cls.objects.update_or_create(
+            order=order, kind=kind, defaults={'html': html, 'etag': cls.etag_for(html)},
+        )
+        return receipt
+
+    @staticmethod
+    def etag_for(html):
+        return hashlib.sha256(html.encode()).hexdigest()[:32]
+
 # --- 4. SHIFT MANAGEMENT ---
 class Shift(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
@@ -88,9 +350,13 @@ class Shift(models.Model):
 
     opening_cash = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
-    # Financials (Calculated at closing)
+    # Financials (Running totals, kept up to date while the shift is open)
     total_sales = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_expenses = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cash_sales = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    card_sales = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    online_sales = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
 
     # The comparison
     calculated_cash = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -102,6 +368,40 @@ class Shift(models.Model):
     def __str__(self):
         return f"Shift #{self.id} - {self.start_time.strftime('%d/%m %H:%M')}"
 
+    @property
+    def expected_cash(self):
+        return self.opening_cash + self.total_sales - self.total_expenses
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(is_active=True).order_by('-id')[:1]
+
+    @classmethod
+    def record_order(cls, order, old_status, new_status):
+        # An order counts towards the open shift it was placed in, once completed
+        sign = (new_status == 'completed') - (old_status == 'completed')
+        if not sign:
+            return
+        amount = sign * order.total_amount
+        changes = {
+            'total_sales': F('total_sales') + amount,
+            'order_count': F('order_count') + sign,
+        }
+        if order.payment_method in dict(Order.PAYMENT_METHODS):
+            method_field = f'{order.payment_method}_sales'
+            changes[method_field] = F(method_field) + amount
+        shifts = cls.objects.filter(pk__in=cls.current(), start_time__lte=order.created_at)
+        if shifts.update(**changes):
+            ChangeLog.capture(shifts)
+
+    def add_expense(self, description, amount):
+        with transaction.atomic():
+            expense = Expense.objects.create(shift=self, description=description, amount=amount)
+            Shift.objects.filter(pk=self.pk).update(total_expenses=F('total_expenses') + amount)
+            ChangeLog.record(expense)
+            ChangeLog.capture(Shift.objects.filter(pk=self.pk))
+        return expense
+
 class Expense(models.Model):
     shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='expenses')
     description = models.CharField(max_length=200)
@@ -110,3 +410,394 @@ class Expense(models.Model):
 
     def __str__(self):
         return f"{self.description}: {self.amount}"
+
+
+# --- 5. REPORTING ---
+class SalesRollup(models.Model):
+    """Pre-aggregated sales per local (date, hour, payment method, order type).
+
+    Kept up to date by ``record`` whenever an order enters or leaves the
+    completed / cancelled states; rebuild with ``manage.py rebuild_sales_rollups``.
+    """
+    # status -> (count field, amount field)
+    TRACKED_STATUSES = {
+        'completed': ('order_count', 'total_sales'),
+        'cancelled': ('cancelled_count', 'cancelled_amount'),
+    }
+
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    payment_method = models.CharField(max_length=10, choices=Order.PAYMENT_METHODS)
+    order_type = models.CharField(max_length=10, choices=Order.ORDER_TYPES)
+
+    order_count = models.PositiveIntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    cancelled_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'hour', 'payment_method', 'order_type'], name='unique_sales_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 {self.order_type}/{self.payment_method}: {self.total_sales}"
+
+    @classmethod
+    def bucket_for(cls, order):
+        local = timezone.localtime(order.created_at)
+        return {
+            'date': local.date(),
+            'hour': local.hour,
+            'payment_method': order.payment_method,
+            'order_type': order.order_type,
+        }
+
+    @classmethod
+    def record(cls, order, old_status, new_status):
+        changes = {}
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status in cls.TRACKED_STATUSES and old_status != new_status:
+                count_field, amount_field = cls.TRACKED_STATUSES[status]
+                changes[count_field] = F(count_field) + sign
+                changes[amount_field] = F(amount_field) + sign * order.total_amount
+        if not changes:
+            return
+
+        # Runs inside the caller's transaction: no savepoints, one INSERT OR IGNORE and one UPDATE
+        bucket = cls.bucket_for(order)
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create([cls(**bucket)], ignore_conflicts=True)
+            cls.objects.filter(**bucket).update(**changes)
+
+    @classmethod
+    def summary(cls, start_date, end_date):
+        totals = cls.objects.filter(date__range=(start_date, end_date)).aggregate(**cls._summary_sums())
+        return {key: value or 0 for key, value in totals.items()}
+
+    @classmethod
+    async def asummary(cls, start_date, end_date):
+        totals = await cls.objects.filter(date__range=(start_date, end_date)).aaggregate(**cls._summary_sums())
+        return {key: value or 0 for key, value in totals.items()}
+
+    @staticmethod
+    def _summary_sums():
+        return {
+            'total_sales': Sum('total_sales'),
+            'order_count': Sum('order_count'),
+            'cancelled_count': Sum('cancelled_count'),
+            'cancelled_amount': Sum('cancelled_amount'),
+        }
+
+
+class ItemSalesRollup(models.Model):
+    """Completed sales per local date and menu item, for category and top-item analytics.
+
+    Kept up to date by ``record`` as orders enter or leave completed; rebuilt
+    alongside SalesRollup by ``manage.py rebuild_sales_rollups``.
+    """
+    date = models.DateField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'menu_item'], name='unique_item_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.menu_item_id}: {self.quantity} / {self.revenue}"
+
+    @staticmethod
+    def line_totals(lines):
+        return lines.annotate(
+            line_quantity=Sum('quantity'),
+            line_revenue=Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+
+    @classmethod
+    def record(cls, order, old_status, new_status):
+        sign = (new_status == 'completed') - (old_status == 'completed')
+        if not sign:
+            return
+        lines = {
+            row['menu_item']: row
+            for row in cls.line_totals(OrderItem.objects.filter(order=order).values('menu_item'))
+        }
+        if not lines:
+            return
+
+        day = timezone.localtime(order.created_at).date()
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create([cls(date=day, menu_item_id=pk) for pk in lines], ignore_conflicts=True)
+            # Every line of the order in one UPDATE
+            cls.objects.filter(date=day, menu_item_id__in=lines).update(
+                quantity=F('quantity') + Case(
+                    *[When(menu_item_id=pk, then=Value(sign * row['line_quantity'])) for pk, row in lines.items()],
+                    default=0, output_field=IntegerField(),
+                ),
+                revenue=F('revenue') + Case(
+                    *[When(menu_item_id=pk, then=Value(sign * row['line_revenue'])) for pk, row in lines.items()],
+                    default=0, output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+
+
+# --- 6. ARCHIVE ---
+class HistoricalOrderFields(models.Model):
+    """Order's columns, for tables and views that hold orders outside the live table.
+
+    Ids are the original order ids, so invoices and exports keep their numbers.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    client_uuid = models.UUIDField(null=True, blank=True, editable=False)
+    order_type = models.CharField(max_length=10, choices=Order.ORDER_TYPES, default='dine-in')
+    payment_method = models.CharField(max_length=10, choices=Order.PAYMENT_METHODS, default='cash')
+    customer_name = models.CharField(max_length=100, blank=True, null=True)
+    customer_phone = models.CharField(max_length=20, blank=True, null=True)
+    cash_given = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    change_due = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    status = models.CharField(max_length=20, choices=Order.STATUSES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    created_at = models.DateTimeField()
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"Order {self.id} ({self.payment_method})"
+
+
+class HistoricalOrderItemFields(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_price(self):
+        return self.quantity * self.price
+
+
+class ArchivedOrder(HistoricalOrderFields):
+    """A closed order moved out of Order by ``manage.py archive_orders``."""
+    table = models.ForeignKey(Table, on_delete=models.SET_NULL, null=True, blank=True)
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ]
+
+
+class ArchivedOrderItem(HistoricalOrderItemFields):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+
+
+class OrderHistory(HistoricalOrderFields):
+    """Live and archived orders as one read-only queryset (the pos_order_history view).
+
+    For reports that may reach past the archive horizon: day lists, exports,
+    rollup rebuilds and shift reconciliation.
+    """
+    table = models.ForeignKey(Table, on_delete=models.DO_NOTHING, null=True, db_constraint=False)
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='history')
+
+    class Meta:
+        managed = False
+        db_table = 'pos_order_history'
+
+
+class OrderItemHistory(HistoricalOrderItemFields):
+    order = models.ForeignKey(OrderHistory, on_delete=models.DO_NOTHING, related_name='items', db_constraint=False)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        managed = False
+        db_table = 'pos_orderitem_history'
+
+
+# --- 7. PRINTING ---
+class PrintJob(models.Model):
+    """A kitchen ticket or receipt waiting for ``manage.py print_worker``.
+
+    Tills only insert rows; the worker renders and sends them, so a slow or
+    offline printer never holds up an order.
+    """
+    KINDS = (
+        ('kot', 'Kitchen Order Ticket'),
+        ('receipt', 'Receipt'),
+    )
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('printing', 'Printing'),
+        ('printed', 'Printed'),
+        ('failed', 'Failed'),
+    )
+    MAX_ATTEMPTS = 5
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='print_jobs')
+    kind = models.CharField(max_length=10, choices=KINDS, default='kot')
+    station = models.CharField(max_length=30)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    # Not before this time: retry backoff, or the lease of the worker printing it
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    printed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='printjob_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for order {self.order_id} at {self.station}"
+
+    @staticmethod
+    def station_for(category_name):
+        for station, config in settings.POS_STATIONS.items():
+            if category_name in config.get('categories', ()):
+                return station
+        return settings.POS_DEFAULT_STATION
+
+    @staticmethod
+    def station_q(station, field='menu_item__category__name'):
+        """station_for() as a filter: the station's own categories, or for the default station every unclaimed one."""
+        if station == settings.POS_DEFAULT_STATION:
+            claimed = [
+                name for other, config in settings.POS_STATIONS.items() if other != station
+                for name in config.get('categories', ())
+            ]
+            return ~Q(**{f'{field}__in': claimed})
+        return Q(**{f'{field}__in': settings.POS_STATIONS.get(station, {}).get('categories', ())})
+
+    @classmethod
+    def enqueue_kot(cls, order, lines):
+        """One ticket per station the order's lines go to. Lines need menu_item.category loaded."""
+        stations = sorted({cls.station_for(line.menu_item.category.name) for line in lines})
+        return cls.objects.bulk_create([cls(order=order, kind='kot', station=station) for station in stations])
+
+    @classmethod
+    def enqueue_receipt(cls, order):
+        return cls.objects.create(order=order, kind='receipt', station=settings.POS_RECEIPT_STATION)
+
+
+# --- 8. BRANCH SYNC ---
+class ChangeLog(models.Model):
+    """Append-only outbox of Order, OrderItem, Shift and Expense changes.
+
+    Written in the same transaction as the change, as a full snapshot of the
+    row, so head office only needs the latest entry per row. Shipped by
+    ``manage.py sync_branch``; the id is the sequence number.
+    """
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.model} {self.object_id}"
+
+    @staticmethod
+    def snapshot(obj):
+        data = {}
+        for field in obj._meta.concrete_fields:
+            value = field.value_from_object(obj)
+            if isinstance(field, DecimalField) and value is not None:
+                # As the database returns it, so both ways of logging agree
+                value = Decimal(value).quantize(Decimal(1).scaleb(-field.decimal_places))
+            data[field.attname] = value
+        return data
+
+    @classmethod
+    def record(cls, *instances):
+        """Log instances as they are in memory (just created or just updated)."""
+        cls.objects.bulk_create([
+            cls(model=obj._meta.model_name, object_id=obj.pk, data=cls.snapshot(obj)) for obj in instances
+        ])
+
+    @classmethod
+    def capture(cls, queryset):
+        """Log the rows of a queryset as stored, after an UPDATE made with F() expressions."""
+        model = queryset.model._meta.model_name
+        cls.objects.bulk_create([cls(model=model, object_id=row['id'], data=row) for row in queryset.values()])
+
+
+class SyncCursor(models.Model):
+    """The last ChangeLog id head office acknowledged."""
+    name = models.CharField(max_length=50, unique=True)
+    last_seq = models.BigIntegerField(default=0)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+
+class BranchRecord(models.Model):
+    """Head office's copy of one branch row: the newest snapshot received for it."""
+    branch = models.CharField(max_length=50)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    seq = models.BigIntegerField()  # the branch ChangeLog id of this snapshot
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    received_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'model', 'object_id'], name='unique_branch_record'),
+        ]
+
+    def __str__(self):
+        return f"{self.branch} {self.model} {self.object_id}"
+
+
+# --- 9. DEVICES ---
+class DeviceToken(models.Model):
+    """A long-lived login for an always-on screen such as a kitchen display.
+
+    Issuing one gives a pairing code, good once for PAIRING_WINDOW. Opening
+    /pair/<code>/ on the screen mints the token and hands it over only as a
+    cookie, so the token itself never appears in a URL or an access log. Only
+    hashes are stored. The screen then signs in as ``user`` on the views in
+    POS_DEVICE_VIEWS without loading a session; see
+    pos.middleware.DeviceTokenMiddleware.
+    """
+    PAIRING_WINDOW = timedelta(minutes=15)
+
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    pairing_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    pairing_expires = models.DateTimeField(null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='device_tokens')
+    revoked = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+    @staticmethod
+    def hash(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, name, user):
+        """Create a device waiting to be paired and return its one-time pairing code."""
+        code = secrets.token_urlsafe(16)
+        cls.objects.create(
+            name=name, user=user,
+            pairing_hash=cls.hash(code), pairing_expires=timezone.now() + cls.PAIRING_WINDOW,
+        )
+        return code
+
+    @classmethod
+    def pair(cls, code):
+        """Use up a pairing code; returns the new device token, or None if the code is unknown, used or expired."""
+        token = secrets.token_urlsafe(32)
+        paired = cls.objects.filter(
+            pairing_hash=cls.hash(code), pairing_expires__gt=timezone.now(), revoked=False,
+        ).update(key_hash=cls.hash(token), pairing_hash=None, pairing_expires=None)
+        return token if paired else None
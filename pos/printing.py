@@ -0,0 +1,151 @@
+import logging
+import os
+import socket
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Order, PrintJob
+
+logger = logging.getLogger('pos.printing')
+
+WIDTH = 42  # characters per line on an 80mm printer
+LEASE = timedelta(minutes=2)  # a job still "printing" after this is taken again
+
+ESC_INIT = b'\x1b@'
+ESC_BOLD_ON, ESC_BOLD_OFF = b'\x1bE\x01', b'\x1bE\x00'
+ESC_DOUBLE, ESC_NORMAL = b'\x1d!\x11', b'\x1d!\x00'
+ESC_CUT = b'\x1dVB\x00'  # feed and full cut
+
+
+def columns(left, right):
+    return f"{left[:WIDTH - len(right) - 1]:<{WIDTH - len(right)}}{right}"
+
+
+def header(order, title):
+    when = timezone.localtime(order.created_at)
+    where = f"TABLE {order.table.name}" if order.order_type == 'dine-in' and order.table else \
+        f"TAKEAWAY {order.customer_name or ''}".strip()
+    return [title, f"Order #{order.id}", columns(where, when.strftime('%d %b %H:%M')), '-' * WIDTH]
+
+
+def kot_text(order, station):
+    """The lines of one order that go to one station."""
+    lines = [
+        item for item in order.items.all()
+        if PrintJob.station_for(item.menu_item.category.name) == station
+    ]
+    body = [f"{item.quantity:>3} x {item.menu_item.name}" for item in lines]
+    return header(order, f"KOT - {station.upper()}") + body
+
+
+def receipt_text(order):
+    body = [columns(f"{item.quantity} x {item.menu_item.name}", str(item.total_price)) for item in order.items.all()]
+    totals = [
+        '-' * WIDTH,
+        columns('TOTAL Rs.', str(order.total_amount)),
+        columns('Cash given', str(order.cash_given)),
+        columns('Change due', str(order.change_due)),
+    ]
+    return header(order, 'BUBLOO KI SAJJI') + body + totals
+
+
+def render(job, order):
+    """One ticket as the station's printer expects it."""
+    text = kot_text(order, job.station) if job.kind == 'kot' else receipt_text(order)
+    if settings.POS_STATIONS[job.station].get('format') == 'text':
+        return ('\n'.join(text) + '\n\n').encode()
+    title, *rest = text
+    return (
+        ESC_INIT + ESC_DOUBLE + ESC_BOLD_ON + title.encode('cp437', 'replace') + ESC_BOLD_OFF + ESC_NORMAL + b'\n'
+        + '\n'.join(rest).encode('cp437', 'replace') + b'\n\n\n\n' + ESC_CUT
+    )
+
+
+def send(device, data, timeout=5):
+    """Write to a printer: tcp://host:port (raw port 9100) or a device/file path."""
+    if device.startswith('tcp://'):
+        host, _, port = device[len('tcp://'):].rpartition(':')
+        with socket.create_connection((host, int(port)), timeout=timeout) as conn:
+            conn.sendall(data)
+        return
+    os.makedirs(os.path.dirname(device) or '.', exist_ok=True)
+    with open(device, 'ab') as printer:
+        printer.write(data)
+
+
+def claim(batch_size):
+    """Take up to batch_size due jobs, so that two workers never print the same one."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PrintJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=('queued', 'printing'), run_after__lte=now)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        PrintJob.objects.filter(id__in=ids).update(
+            status='printing', attempts=F('attempts') + 1, run_after=now + LEASE,
+        )
+    return list(PrintJob.objects.filter(id__in=ids).order_by('id'))
+
+
+def run_once(batch_size=20):
+    """Print one batch of due jobs; returns (printed, failed) counts.
+
+    Jobs for the same station go out in one write. A station that fails has
+    its jobs retried with exponential backoff, up to PrintJob.MAX_ATTEMPTS.
+    """
+    jobs = claim(batch_size)
+    if not jobs:
+        return 0, 0
+    orders = Order.objects.select_related('table').prefetch_related('items__menu_item__category').in_bulk(
+        {job.order_id for job in jobs}
+    )
+    by_station = defaultdict(list)
+    for job in jobs:
+        by_station[job.station].append(job)
+
+    printed = failed = 0
+    for station, station_jobs in by_station.items():
+        try:
+            device = settings.POS_STATIONS[station]['device']
+            send(device, b''.join(render(job, orders[job.order_id]) for job in station_jobs))
+        except Exception as e:
+            logger.warning("Printing to %s failed: %s", station, e)
+            for job in station_jobs:
+                give_up = job.attempts >= PrintJob.MAX_ATTEMPTS
+                PrintJob.objects.filter(pk=job.pk).update(
+                    status='failed' if give_up else 'queued',
+                    last_error=str(e)[:255],
+                    run_after=timezone.now() + timedelta(seconds=2 ** job.attempts),
+                )
+            failed += len(station_jobs)
+        else:
+            PrintJob.objects.filter(pk__in=[job.pk for job in station_jobs]).update(
+                status='printed', printed_at=timezone.now(), last_error='',
+            )
+            printed += len(station_jobs)
+    return printed, failed
+
+
+def queue_summary(limit=50):
+    """Counts per station and status, plus the most recent jobs, for the queue screen."""
+    counts = defaultdict(dict)
+    for station, status, count in (
+        PrintJob.objects.filter(Q(status__in=('queued', 'printing', 'failed')) | Q(created_at__date=timezone.localdate()))
+        .values_list('station', 'status').annotate(n=Count('id')).order_by()
+    ):
+        counts[station][status] = count
+    recent = [
+        {
+            'id': job.id, 'order_id': job.order_id, 'kind': job.kind, 'station': job.station,
+            'status': job.status, 'attempts': job.attempts, 'error': job.last_error,
+            'created_at': timezone.localtime(job.created_at).isoformat(timespec='seconds'),
+        }
+        for job in PrintJob.objects.order_by('-id')[:limit]
+    ]
+    return {'counts': counts, 'jobs': recent}
@@ -0,0 +1,52 @@
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+_use_replica = ContextVar('pos_use_replica', default=False)
+
+
+class ReplicaRouter:
+    """Sends reads to the 'replica' alias inside views wrapped with ``read_replica``.
+
+    Everything else, and every write, stays on 'default', so a request that
+    places or updates an order always reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and 'replica' in settings.DATABASES:
+            return 'replica'
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
+
+
+def read_replica(view):
+    """Run a read-only view (sync or async) against the replica, when one is configured."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
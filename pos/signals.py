@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, MenuItem, MenuVersion
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=MenuItem)
+def bump_menu_version(sender, **kwargs):
+    # Admin edits and populate_menu.py both land here; tills pick up the new version
+    MenuVersion.bump()
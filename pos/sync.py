@@ -0,0 +1,133 @@
+import gzip
+import json
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BranchRecord, ChangeLog, SyncCursor
+
+CURSOR = 'central'
+# ChangeLog ids are handed out at INSERT but become visible at COMMIT, which on
+# Postgres need not be in id order. A cursor that moved past an id whose
+# transaction was still open would skip it for good, so only entries older
+# than this (far longer than any till transaction) are shipped.
+SETTLE = timedelta(seconds=60)
+
+
+class SyncFailed(Exception):
+    pass
+
+
+# --- Branch side ---
+def encode_batch(branch, changes):
+    payload = {
+        'branch': branch,
+        'changes': [
+            {'seq': change.id, 'model': change.model, 'object_id': change.object_id, 'data': change.data}
+            for change in changes
+        ],
+    }
+    return gzip.compress(json.dumps(payload, cls=DjangoJSONEncoder).encode())
+
+
+def post(url, body, timeout=30):
+    """Send one gzipped batch to head office; returns the decoded JSON reply."""
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Authorization': f'Bearer {settings.POS_SYNC_TOKEN}',
+    })
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def ship(url=None, batch_size=500, send=post, settle=SETTLE):
+    """Ship every settled, unsent ChangeLog entry in batches; returns how many were acknowledged.
+
+    The cursor only moves when head office confirms a batch, so a branch that
+    is offline just ships more next time. Each run reads changes by id after
+    the cursor, so the cost follows the number of changes, not the table sizes.
+    A batch stops at the first entry younger than ``settle``, so the cursor
+    only ever passes ids whose transactions finished long ago.
+    """
+    url = url or settings.POS_SYNC_URL
+    cursor, _ = SyncCursor.objects.get_or_create(name=CURSOR)
+    shipped = 0
+    while True:
+        changes = list(ChangeLog.objects.filter(id__gt=cursor.last_seq).order_by('id')[:batch_size])
+        cutoff = timezone.now() - settle
+        settled = next((i for i, change in enumerate(changes) if change.created_at > cutoff), len(changes))
+        changes = changes[:settled]
+        if not changes:
+            return shipped
+        try:
+            reply = send(url, encode_batch(settings.POS_BRANCH, changes))
+        except OSError as e:
+            raise SyncFailed(f"Head office unreachable after {shipped} changes: {e}") from e
+        if reply.get('applied_through') != changes[-1].id:
+            raise SyncFailed(f"Head office did not confirm the batch: {reply}")
+        cursor.last_seq, cursor.synced_at = changes[-1].id, timezone.now()
+        cursor.save(update_fields=['last_seq', 'synced_at'])
+        shipped += len(changes)
+
+
+# --- Head office side ---
+def decode_batch(body, encoding=''):
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    payload = json.loads(body)
+    branch, changes = payload['branch'], payload['changes']
+    # Check the shape up front so a bad entry is a 400, not an error halfway through apply_batch
+    if not isinstance(branch, str) or not isinstance(changes, list):
+        raise ValueError('malformed batch')
+    for change in changes:
+        if not (isinstance(change, dict) and isinstance(change.get('model'), str) and 'data' in change
+                and all(type(change.get(key)) is int for key in ('object_id', 'seq'))):
+            raise ValueError('malformed change')
+    return branch, changes
+
+
+def apply_batch(branch, changes):
+    """Upsert a branch's changes into BranchRecord; returns the last seq in the batch.
+
+    Idempotent: a row only takes a snapshot newer than the one it holds, so a
+    batch re-sent after a lost reply changes nothing. One read and one
+    INSERT ... ON CONFLICT per batch, however many rows it touches.
+    """
+    latest = {}
+    for change in changes:
+        key = (change['model'], change['object_id'])
+        if key not in latest or change['seq'] > latest[key]['seq']:
+            latest[key] = change
+    if not latest:
+        return None
+
+    by_model = {}
+    for model, object_id in latest:
+        by_model.setdefault(model, []).append(object_id)
+    rows = Q()
+    for model, ids in by_model.items():
+        rows |= Q(model=model, object_id__in=ids)
+
+    with transaction.atomic():
+        held = {
+            (model, object_id): seq
+            for model, object_id, seq in BranchRecord.objects.filter(rows, branch=branch)
+            .values_list('model', 'object_id', 'seq')
+        }
+        BranchRecord.objects.bulk_create(
+            [
+                BranchRecord(branch=branch, model=model, object_id=object_id, seq=change['seq'], data=change['data'])
+                for (model, object_id), change in latest.items()
+                if change['seq'] > held.get((model, object_id), 0)
+            ],
+            update_conflicts=True,
+            unique_fields=['branch', 'model', 'object_id'],
+            update_fields=['seq', 'data', 'received_at'],
+        )
+    return max(change['seq'] for change in changes)
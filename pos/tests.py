@@ -1,3 +1,1314 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import analytics, auth, events, export, printing, sync, views
+from .menu import get_menu
+from .middleware import registry
+from .routers import ReplicaRouter, read_replica
+from .models import ArchivedOrder, BranchRecord, ChangeLog, Customer, DeviceToken, Expense, InvalidTransition, Category, ItemSalesRollup, MenuItem, MenuVersion, Table, Order, OrderHistory, OrderItem, PrintJob, Receipt, SalesRollup, Shift, SyncCursor
+
+
+class PosTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="B.B.Q")
+        cls.boti = MenuItem.objects.create(category=cls.category, name="Malai Boti (10Pcs)", price=Decimal('999'))
+        cls.kabab = MenuItem.objects.create(category=cls.category, name="Chicken Kabab (4Pcs)", price=Decimal('890'))
+        cls.table = Table.objects.create(name="Table 1")
+
+    def post_order(self, **payload):
+        payload.setdefault('cart', [{'id': self.boti.id, 'quantity': 2}, {'id': self.kabab.id, 'quantity': 1}])
+        payload.setdefault('order_type', 'dine-in')
+        payload.setdefault('table_id', self.table.id)
+        return self.client.post('/place-order/', json.dumps(payload), content_type='application/json')
+
+
+# --- PLACE ORDER ---
+class PlaceOrderTests(PosTestCase):
+    def test_dine_in_order_totals_and_table(self):
+        response = self.post_order(payment_method='cash', cash_given='3000')
+        self.assertEqual(response.json()['status'], 'success')
+
+        order = Order.objects.get(id=response.json()['order_id'])
+        self.assertEqual(order.total_amount, Decimal('2888'))
+        self.assertEqual(order.change_due, Decimal('112'))
+        self.assertEqual(order.items.count(), 2)
+        self.table.refresh_from_db()
+        self.assertEqual(self.table.status, 'occupied')
+
+    def test_card_payment_records_total_as_paid(self):
+        response = self.post_order(payment_method='card')
+        order = Order.objects.get(id=response.json()['order_id'])
+        self.assertEqual(order.cash_given, Decimal('2888'))
+        self.assertEqual(order.change_due, Decimal('0'))
+
+    def test_unknown_items_are_skipped(self):
+        response = self.post_order(cart=[{'id': self.boti.id, 'quantity': 1}, {'id': 9999, 'quantity': 5}])
+        order = Order.objects.get(id=response.json()['order_id'])
+        self.assertEqual(order.total_amount, Decimal('999'))
+        self.assertEqual(order.items.count(), 1)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        items = [MenuItem.objects.create(category=self.category, name=f"Item {i}", price=100) for i in range(12)]
+        with self.assertNumQueries(8):  # menu, table, order, lines, print jobs, change log, savepoint and release
+            self.post_order(cart=[{'id': item.id, 'quantity': 1} for item in items])
+
+    def test_missing_table_leaves_nothing_behind(self):
+        response = self.post_order(table_id=9999)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_takeaway_requires_name(self):
+        response = self.post_order(order_type='takeaway', customer_name='')
+        self.assertEqual(response.status_code, 400)
+
+
+# --- LIVE EVENTS ---
+class EventTests(PosTestCase):
+    def setUp(self):
+        self.broker = events.EventBroker()
+        patcher = mock.patch.object(events, 'broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_place_order_announces_order_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order_id = self.post_order().json()['order_id']
+
+        stream = self.broker.stream(last_id=0)
+        self.assertEqual(next(stream), 'retry: 3000\n\n')
+        created = next(stream)
+        stream.close()
+        self.assertIn('event: order.created', created)
+        self.assertIn(f'"id": {order_id}', created)
+        self.assertIn('Malai Boti (10Pcs)', created)
+
+    def test_cancel_announces_status_and_freed_table(self):
+        Table.objects.filter(pk=self.table.pk).update(status='occupied')
+        order = Order.objects.create(table=self.table, total_amount=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/cancel-order/{order.id}/')
+
+        backlog = [event[1] for event in self.broker._history]
+        self.assertEqual(backlog, ['order.status', 'table.freed'])
+
+    def test_reconnect_only_replays_missed_events(self):
+        for i in range(3):
+            self.broker.publish('order.status', {'id': i})
+        stream = self.broker.stream(last_id=2)
+        next(stream)
+        self.assertTrue(next(stream).startswith('id: 3\n'))
+        stream.close()
+
+
+# --- MANAGER DASHBOARD ---
+class TableDashboardTests(PosTestCase):
+    def setUp(self):
+        user = User.objects.create_user('manager', password='secret')
+        self.client.force_login(user)
+
+    def occupy_tables(self, count):
+        for i in range(count):
+            table = Table.objects.create(name=f"Floor {Table.objects.count()}", status='occupied')
+            Order.objects.create(table=table, status='pending', total_amount=100)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/tables/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_tables(self):
+        self.occupy_tables(2)
+        self.count_queries()  # the session user is cached from here on
+        baseline = self.count_queries()
+        self.occupy_tables(30)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_shows_latest_open_order_per_table(self):
+        self.table.status = 'occupied'
+        self.table.save()
+        Order.objects.create(table=self.table, status='completed', total_amount=1)
+        latest = Order.objects.create(table=self.table, status='ready', total_amount=2)
+
+        response = self.client.get('/tables/')
+        active = {row['obj'].id: row['active_order'] for row in response.context['tables']}
+        self.assertEqual(active[self.table.id], latest)
+        # The page patches its tiles from events, starting from these open orders
+        self.assertEqual(response.context['open_orders'][self.table.id], [
+            {'id': latest.id, 'total': '2.00', 'customer_name': None},
+        ])
+        self.assertContains(response, f'id="table-{self.table.id}"')
+
+
+# --- SALES ROLLUP ---
+class SalesRollupTests(PosTestCase):
+    def test_settle_and_void_update_rollup(self):
+        paid = Order.objects.create(order_type='takeaway', customer_name='Ali', total_amount=500)
+        voided = Order.objects.create(order_type='takeaway', customer_name='Sara', total_amount=300)
+        self.client.get(f'/settle-order/{paid.id}/')
+        self.client.get(f'/cancel-order/{voided.id}/')
+
+        today = timezone.localdate()
+        totals = SalesRollup.summary(today, today)
+        self.assertEqual(totals['total_sales'], Decimal('500'))
+        self.assertEqual(totals['order_count'], 1)
+        self.assertEqual(totals['cancelled_amount'], Decimal('300'))
+
+    def test_moving_out_of_completed_reverses_the_sale(self):
+        order = Order.objects.create(table=self.table, total_amount=700)
+        self.client.get(f'/order-status/{order.id}/completed/')
+        self.client.get(f'/cancel-order/{order.id}/')
+
+        today = timezone.localdate()
+        totals = SalesRollup.summary(today, today)
+        self.assertEqual(totals['order_count'], 0)
+        self.assertEqual(totals['cancelled_count'], 1)
+
+    def test_rebuild_matches_live_history(self):
+        Order.objects.create(table=self.table, status='completed', total_amount=250, payment_method='card')
+        Order.objects.create(table=self.table, status='cancelled', total_amount=90)
+        Order.objects.create(table=self.table, status='pending', total_amount=40)
+
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        call_command('rebuild_sales_rollups', '--check', stdout=io.StringIO())
+        self.assertEqual(SalesRollup.objects.get(payment_method='card').total_sales, Decimal('250'))
+
+    def test_check_reports_drift(self):
+        Order.objects.create(table=self.table, status='completed', total_amount=250)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollups', '--check', stdout=io.StringIO(), stderr=io.StringIO())
+
+
+# --- QUERY PLANS ---
+class QueryPlanTests(PosTestCase):
+    """The hot Order queries must be answered from an index, never a full scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start = timezone.now() - timedelta(days=400)
+        history = []
+        for i in range(4000):
+            status = 'pending' if i % 200 == 0 else ('cancelled' if i % 25 == 0 else 'completed')
+            history.append(Order(table=cls.table, status=status, total_amount=100,
+                                 order_type='takeaway' if i % 3 else 'dine-in'))
+        Order.objects.bulk_create(history)
+        Order.objects.update(created_at=start)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', password='secret'))
+
+    def full_scans(self, sql, params=()):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                return [line for line in plan if 'Seq Scan on pos_order ' in line or 'Seq Scan on pos_archivedorder ' in line]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            return [line for line in plan
+                    if line.startswith(('SCAN pos_order', 'SCAN pos_archivedorder')) and 'USING' not in line]
+
+    def assertViewUsesIndexes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        order_queries = [q['sql'] for q in ctx.captured_queries
+                         if ('"pos_order"' in q['sql'] or '"pos_order_history"' in q['sql'])
+                         and q['sql'].startswith('SELECT')]
+        self.assertTrue(order_queries)
+        for sql in order_queries:
+            self.assertEqual(self.full_scans(sql), [], sql)
+
+    def test_kitchen_dashboard(self):
+        self.assertViewUsesIndexes('/kitchen/')
+
+    def test_table_dashboard(self):
+        self.assertViewUsesIndexes('/tables/')
+
+    def test_sales_dashboard(self):
+        self.assertViewUsesIndexes('/report/')
+
+    def test_shift_sales_query(self):
+        qs = Order.objects.filter(created_at__gte=timezone.now(), status='completed')
+        sql, params = qs.query.sql_with_params()
+        self.assertEqual(self.full_scans(sql, params), [])
+
+
+# --- SHIFT TOTALS ---
+class ShiftTotalsTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+        self.shift = Shift.objects.create(opening_cash=1000)
+
+    def test_completed_orders_and_expenses_update_running_totals(self):
+        cash = Order.objects.create(table=self.table, total_amount=500)
+        card = Order.objects.create(table=self.table, total_amount=300, payment_method='card')
+        voided = Order.objects.create(table=self.table, total_amount=200)
+        for order in (cash, card, voided):
+            self.client.get(f'/settle-order/{order.id}/')
+        self.client.get(f'/cancel-order/{voided.id}/')
+        self.shift.add_expense('Charcoal', Decimal('150'))
+
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.total_sales, Decimal('800'))
+        self.assertEqual(self.shift.cash_sales, Decimal('500'))
+        self.assertEqual(self.shift.card_sales, Decimal('300'))
+        self.assertEqual(self.shift.order_count, 2)
+        self.assertEqual(self.shift.total_expenses, Decimal('150'))
+        self.assertEqual(self.shift.expected_cash, Decimal('1650'))
+        call_command('reconcile_shifts', stdout=io.StringIO())
+
+    def test_close_shift_uses_running_totals(self):
+        Shift.objects.filter(pk=self.shift.pk).update(total_sales=900, total_expenses=100)
+        with self.assertNumQueries(7):  # user (the session is cached), shift, one UPDATE and its change log entry in a savepoint
+            self.client.post('/shift/', {'action': 'close_shift', 'actual_cash': '1750'})
+
+        self.shift.refresh_from_db()
+        self.assertFalse(self.shift.is_active)
+        self.assertEqual(self.shift.calculated_cash, Decimal('1800'))
+        self.assertEqual(self.shift.difference, Decimal('-50'))
+
+    def test_shift_page_shows_running_totals(self):
+        order = Order.objects.create(table=self.table, total_amount=500)
+        self.client.get(f'/settle-order/{order.id}/')
+        self.shift.add_expense('Charcoal', Decimal('150'))
+
+        response = self.client.get('/shift/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="shift-sales">500.00<')
+        self.assertContains(response, 'id="shift-expenses">150.00<')
+        self.assertContains(response, 'id="shift-expected">1350.00<')
+        self.assertContains(response, 'Charcoal')
+
+        self.client.post('/shift/', {'action': 'close_shift', 'actual_cash': '1350'})
+        response = self.client.get('/shift/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Start Shift')
+        self.assertEqual(list(response.context['recent_shifts']), [self.shift])
+
+    def test_reconcile_fixes_drift(self):
+        Order.objects.create(table=self.table, status='completed', total_amount=400)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_shifts', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('reconcile_shifts', '--fix', stdout=io.StringIO(), stderr=io.StringIO())
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.cash_sales, Decimal('400'))
+
+    def test_order_settled_after_its_shift_closed_is_not_drift(self):
+        inside = Order.objects.create(table=self.table, total_amount=500)
+        inside.transition('completed')
+        late = Order.objects.create(table=self.table, total_amount=300)
+        self.client.post('/shift/', {'action': 'close_shift', 'actual_cash': '1500'})
+        late.transition('completed')  # no shift open: the live counters leave it out
+
+        out = io.StringIO()
+        call_command('reconcile_shifts', '--shift', str(self.shift.pk), '--fix', stdout=out, stderr=io.StringIO())
+        self.assertIn('OK', out.getvalue())
+        self.shift.refresh_from_db()
+        self.assertEqual((self.shift.total_sales, self.shift.calculated_cash, self.shift.difference),
+                         (Decimal('500'), Decimal('1500'), Decimal('0')))
+
+    def test_fixing_a_closed_shift_recomputes_its_cash_count(self):
+        Order.objects.create(table=self.table, status='completed', total_amount=400)  # missed by the counters
+        self.client.post('/shift/', {'action': 'close_shift', 'actual_cash': '1000'})
+        call_command('reconcile_shifts', '--shift', str(self.shift.pk), '--fix', stdout=io.StringIO(), stderr=io.StringIO())
+        self.shift.refresh_from_db()
+        self.assertEqual((self.shift.total_sales, self.shift.calculated_cash, self.shift.difference),
+                         (Decimal('400'), Decimal('1400'), Decimal('-400')))
+
+
+# --- MENU CACHE ---
+class MenuCacheTests(PosTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+
+    def test_menu_changes_bump_the_version(self):
+        version = MenuVersion.current()
+        self.boti.price = Decimal('1050')
+        self.boti.save()
+        self.assertEqual(MenuVersion.current(), version + 1)
+        self.assertIn('"price": "1050.00"', get_menu()['json'])
+
+    def test_dashboard_queries_do_not_grow_with_menu(self):
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get('/')
+        for i in range(20):
+            MenuItem.objects.create(category=self.category, name=f"Item {i}", price=100)
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as grown:
+            response = self.client.get('/')
+        self.assertEqual(len(grown.captured_queries), len(cached.captured_queries))
+        self.assertContains(response, 'Item 19')
+
+    def test_menu_json_revalidates_with_etag(self):
+        response = self.client.get('/menu.json')
+        self.assertEqual(response.json()['items'][0]['name'], self.boti.name)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get('/menu.json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.kabab.delete()
+        self.assertEqual(self.client.get('/menu.json', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# --- THUMBNAILS ---
+class ThumbnailTests(PosTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, name='sajji.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 900), 'orange').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_creates_size_buckets_next_to_original(self):
+        item = MenuItem.objects.create(category=self.category, name="Sajji", price=2300, image=self.upload())
+
+        folder = os.path.join(self.media_root, 'menu_items')
+        self.assertIn('sajji_160w.webp', os.listdir(folder))
+        with Image.open(os.path.join(folder, 'sajji_320w.jpg')) as thumb:
+            self.assertEqual(thumb.size, (320, 240))
+        self.assertIn('/media/menu_items/sajji_480w.webp 480w', item.webp_srcset)
+
+    def test_backfill_fills_in_missing_thumbnails(self):
+        item = MenuItem.objects.create(category=self.category, name="Sajji", price=2300, image=self.upload())
+        os.remove(os.path.join(self.media_root, 'menu_items', 'sajji_160w.jpg'))
+
+        out = io.StringIO()
+        call_command('backfill_thumbnails', '--workers', '1', stdout=out)
+        self.assertIn('1 thumbnails written', out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, item.image.name.replace('.png', '_160w.jpg'))))
+
+
+# --- IDEMPOTENT / BULK ORDERS ---
+class IdempotentOrderTests(PosTestCase):
+    def test_retry_with_same_client_uuid_returns_original_order(self):
+        key = str(uuid.uuid4())
+        first = self.post_order(client_uuid=key).json()
+        retry = self.post_order(client_uuid=key).json()
+
+        self.assertEqual(retry['order_id'], first['order_id'])
+        self.assertTrue(retry['duplicate'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    def test_bulk_flush_dedupes_and_reports_each_order(self):
+        queued = [
+            {'client_uuid': str(uuid.uuid4()), 'order_type': 'takeaway', 'customer_name': 'Ali',
+             'cart': [{'id': self.boti.id, 'quantity': 1}]},
+            {'client_uuid': str(uuid.uuid4()), 'order_type': 'takeaway', 'customer_name': '',
+             'cart': [{'id': self.boti.id, 'quantity': 1}]},
+        ]
+        self.post_order(client_uuid=queued[0]['client_uuid'], order_type='takeaway', customer_name='Ali')
+
+        response = self.client.post('/place-orders/', json.dumps({'orders': queued}), content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual(results[0]['status'], 'success')
+        self.assertTrue(results[0]['duplicate'])
+        self.assertEqual(results[1]['status'], 'error')
+        self.assertNotIn('retry', results[1])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_bulk_flush_creates_every_new_order(self):
+        queued = [
+            {'client_uuid': str(uuid.uuid4()), 'order_type': 'takeaway', 'customer_name': f'Guest {i}',
+             'cart': [{'id': self.kabab.id, 'quantity': 2}]}
+            for i in range(5)
+        ]
+        response = self.client.post('/place-orders/', json.dumps({'orders': queued}), content_type='application/json')
+        self.assertEqual([r['status'] for r in response.json()['results']], ['success'] * 5)
+        self.assertEqual(Order.objects.filter(total_amount=Decimal('1780')).count(), 5)
+
+    def test_unparseable_orders_are_rejected_not_retried(self):
+        bad = {'client_uuid': str(uuid.uuid4()), 'order_type': 'takeaway', 'customer_name': 'Ali',
+               'cash_given': '1,000', 'cart': [{'id': self.boti.id, 'quantity': 1}]}
+        response = self.client.post('/place-order/', json.dumps(bad), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('retry', response.json())
+
+        good = dict(bad, client_uuid=str(uuid.uuid4()), cash_given='5000')
+        queued = [bad, dict(bad, client_uuid=str(uuid.uuid4()), cart=[{'id': 'x'}]), 'not an order', good]
+        response = self.client.post('/place-orders/', json.dumps({'orders': queued}), content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'error', 'error', 'success'])
+        self.assertFalse(any(r.get('retry') for r in results))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_only_database_outages_are_retried(self):
+        queued = [
+            {'client_uuid': str(uuid.uuid4()), 'order_type': 'takeaway', 'customer_name': f'Guest {i}',
+             'cart': [{'id': self.kabab.id, 'quantity': 1}]}
+            for i in range(2)
+        ]
+        real_create = Order.objects.create
+        calls = []
+        def locked_once(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return real_create(**kwargs)
+        with mock.patch.object(Order.objects, 'create', side_effect=locked_once):
+            response = self.client.post('/place-orders/', json.dumps({'orders': queued}), content_type='application/json')
+        results = response.json()['results']
+        self.assertTrue(results[0]['retry'])
+        self.assertEqual(results[1]['status'], 'success')
+        # The failed order's savepoint was rolled back; the other one committed
+        self.assertEqual(list(Order.objects.values_list('customer_name', flat=True)), ['Guest 1'])
+
+        with mock.patch.object(Order.objects, 'create', side_effect=OperationalError('database is locked')):
+            response = self.post_order(client_uuid=str(uuid.uuid4()))
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()['retry'])
+
+
+# --- EXPORT ---
+class ExportTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('accountant', password='secret'))
+        for status in ('completed', 'cancelled'):
+            order = Order.objects.create(table=self.table, status=status, total_amount=999)
+            OrderItem.objects.create(order=order, menu_item=self.boti, quantity=1, price=999)
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_line_items_with_status_filter(self):
+        today = timezone.localdate().isoformat()
+        response = self.client.get('/export/', {'start': today, 'end': today, 'status': 'completed'})
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+
+        self.assertEqual(rows[0][:3], ['order_id', 'created_at', 'status'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], 'completed')
+        self.assertEqual(rows[1][8], self.boti.name)
+
+    def test_date_range_excludes_other_days(self):
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = self.client.get('/export/', {'start': tomorrow, 'kind': 'orders'})
+        self.assertEqual(len(self.read(response).splitlines()), 1)
+
+    def test_invalid_dates_are_refused(self):
+        for params in ({'start': '2026-13-01'}, {'end': '01/02/2026'}, {'start': '2026-02-01', 'end': '2026-01-01'}):
+            self.assertEqual(self.client.get('/export/', params).status_code, 400)
+
+    def test_columnar_format(self):
+        lines = self.read(self.client.get('/export/', {'format': 'columnar', 'kind': 'orders'})).splitlines()
+        columns = json.loads(lines[0])['columns']
+        block = dict(zip(columns, json.loads(lines[1])))
+        self.assertEqual(block['status'], ['completed', 'cancelled'])
+        self.assertEqual(block['total_amount'], ['999.00', '999.00'])
+
+
+# --- METRICS ---
+class MetricsTests(PosTestCase):
+    def setUp(self):
+        registry.reset()
+        self.client.force_login(User.objects.create_user('manager', password='secret', is_staff=True))
+
+    def test_histograms_per_url_name(self):
+        self.client.get('/tables/')
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('pos_request_duration_seconds_count{view="table_dashboard"} 1', body)
+        self.assertIn('pos_request_queries_bucket{view="table_dashboard",le="+Inf"} 1', body)
+        self.assertIn('# TYPE pos_request_db_seconds histogram', body)
+
+    def test_each_family_is_contiguous_under_its_type(self):
+        self.client.get('/tables/')
+        self.client.get('/kitchen/')
+        body = self.client.get('/metrics').content.decode()
+
+        family, seen = None, []
+        for line in body.splitlines():
+            if line.startswith('# TYPE '):
+                family = line.split()[2]
+                self.assertNotIn(family, seen)
+                seen.append(family)
+            elif not line.startswith('#'):
+                name = line.split('{')[0]
+                self.assertIn(name, (family, f'{family}_bucket', f'{family}_sum', f'{family}_count'))
+        self.assertEqual(len(seen), 5)
+
+    def test_requires_staff_or_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(POS_METRICS_TOKEN='scrape-me'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+    @override_settings(POS_QUERY_BUDGET=1)
+    def test_logs_requests_over_budget_with_repeated_queries(self):
+        batch = [{'cart': [{'id': self.boti.id, 'quantity': 1}], 'order_type': 'dine-in', 'table_id': self.table.id}
+                 for _ in range(3)]
+
+        with self.assertLogs('pos.metrics', 'WARNING') as logs:
+            self.client.post('/place-orders/', json.dumps({'orders': batch}), content_type='application/json')
+        self.assertIn('/place-orders/ ran', logs.output[0])
+        self.assertIn('3x INSERT INTO "pos_order"', logs.output[0])
+        self.assertIn('pos_request_over_query_budget_total{view="place_orders_bulk"} 1',
+                      self.client.get('/metrics').content.decode())
+
+
+# --- SQLITE UNDER LOAD ---
+class SqliteConcurrencyTests(TransactionTestCase):
+    WRITERS = 20
+    ORDERS_EACH = 5
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite profile only")
+        category = Category.objects.create(name="B.B.Q")
+        self.boti = MenuItem.objects.create(category=category, name="Malai Boti (10Pcs)", price=Decimal('999'))
+        self.user = User.objects.create_user('kitchen', password='secret')
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_parallel_writers_never_see_lock_errors(self):
+        tables = Table.objects.bulk_create(Table(name=f"Table {i}") for i in range(self.WRITERS))
+        errors, statuses = [], []
+        start = threading.Barrier(self.WRITERS + 2)
+
+        def till(table):
+            client = Client()
+            start.wait()
+            try:
+                for _ in range(self.ORDERS_EACH):
+                    response = client.post('/place-order/', json.dumps({
+                        'cart': [{'id': self.boti.id, 'quantity': 1}],
+                        'order_type': 'dine-in', 'table_id': table.id,
+                    }), content_type='application/json')
+                    statuses.append(response.json()['status'])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        def kitchen():
+            client = Client()
+            client.force_login(self.user)
+            start.wait()
+            try:
+                for _ in range(self.ORDERS_EACH * 2):
+                    self.assertEqual(client.get('/kitchen/').status_code, 200)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=till, args=(table,)) for table in tables]
+        threads += [threading.Thread(target=kitchen) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, ['success'] * self.WRITERS * self.ORDERS_EACH)
+        self.assertEqual(Order.objects.count(), self.WRITERS * self.ORDERS_EACH)
+
+
+# --- DATABASE ROUTING ---
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    @mock.patch.dict(settings.DATABASES, {'replica': {}})
+    def test_read_only_views_read_from_replica(self):
+        @read_replica
+        def report():
+            return self.router.db_for_read(Order), self.router.db_for_write(Order)
+
+        self.assertEqual(report(), ('replica', 'default'))
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    def test_event_driven_refetches_read_from_the_primary(self):
+        self.client.force_login(User.objects.create_user('manager', password='secret'))
+        choose, routed = ReplicaRouter.db_for_read, []
+
+        def record(router, model, **hints):
+            routed.append(choose(router, model, **hints))
+            return 'default'  # the test database only has the one connection
+
+        with mock.patch.dict(settings.DATABASES, {'replica': dict(connection.settings_dict)}), \
+                mock.patch.object(ReplicaRouter, 'db_for_read', record):
+            self.client.get('/kitchen/all-day.json')
+            self.client.get('/report/orders.json', {'since': '0-0'})
+            self.assertEqual(set(routed), {'default'})
+
+            self.client.get('/tables/')  # a full page load may still use the replica
+            self.assertIn('replica', routed)
+
+    def test_without_replica_everything_uses_default(self):
+        self.assertEqual(read_replica(lambda: self.router.db_for_read(Order))(), 'default')
+
+
+# --- ASYNC VIEWS ---
+class AsyncViewTests(PosTestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user('manager', password='secret')
+        self.table.status = 'occupied'
+        self.table.save()
+        self.order = Order.objects.create(table=self.table, status='pending', total_amount=999)
+        OrderItem.objects.create(order=self.order, menu_item=self.boti, quantity=1, price=999)
+
+    async def test_screens_render_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for url in ('/kitchen/', '/tables/', '/report/'):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+        registry.reset()
+        self.assertContains(await self.async_client.get('/kitchen/'), self.boti.name)
+        # Queries run off the event loop thread (sync_to_async) still reach the metrics
+        sample = next(line for line in registry.render().splitlines()
+                      if line.startswith('pos_request_queries_sum{view="kitchen_dashboard"}'))
+        self.assertGreater(float(sample.split()[-1]), 0)
+
+    async def test_status_changes_under_asgi(self):
+        response = await self.async_client.get(f'/order-status/{self.order.id}/ready/')
+        self.assertEqual(response.json(), {'status': 'success'})
+        await self.async_client.get(f'/settle-order/{self.order.id}/')
+
+        await self.order.arefresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+        self.assertEqual((await SalesRollup.asummary(timezone.localdate(), timezone.localdate()))['order_count'], 1)
+
+    async def test_cancel_frees_table_under_asgi(self):
+        await self.async_client.get(f'/cancel-order/{self.order.id}/')
+        await self.table.arefresh_from_db()
+        self.assertEqual(self.table.status, 'available')
+        self.assertEqual((await self.async_client.get('/cancel-order/0/')).status_code, 404)
+
+
+# --- ORDER STATE MACHINE ---
+class OrderTransitionTests(PosTestCase):
+    def setUp(self):
+        Table.objects.filter(pk=self.table.pk).update(status='occupied')
+        self.order = Order.objects.create(table=self.table, total_amount=999)
+
+    def test_transition_is_one_conditional_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.order.transition('ready')
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "pos_order"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "status"', updates[0])
+        self.assertNotIn('"total_amount"', updates[0])
+
+    def test_settling_stays_small_and_renders_nothing(self):
+        OrderItem.objects.create(order=self.order, menu_item=self.boti, quantity=1, price=999)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.order.transition('completed')
+        writes = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # order, change log, sales rollup x2, item lines + item rollup x2, shift, table
+        self.assertEqual(len(writes), 9, writes)
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_stale_instance_loses_the_race(self):
+        cashier = Order.objects.get(pk=self.order.pk)
+        self.order.transition('cancelled')  # the kitchen rejects it first
+        with self.assertRaises(InvalidTransition):
+            cashier.transition('completed')
+        self.assertEqual(SalesRollup.summary(timezone.localdate(), timezone.localdate())['order_count'], 0)
+
+    def test_disallowed_and_unknown_statuses(self):
+        self.assertEqual(self.client.get(f'/order-status/{self.order.id}/served/').status_code, 400)
+        self.order.transition('completed')
+        response = self.client.get(f'/order-status/{self.order.id}/ready/')
+        self.assertEqual(response.status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+
+    def test_table_is_freed_with_its_last_open_order(self):
+        second = Order.objects.create(table=self.table, total_amount=500)
+        self.order.transition('cancelled')
+        self.table.refresh_from_db()
+        self.assertEqual(self.table.status, 'occupied')
+
+        second.transition('completed')
+        self.table.refresh_from_db()
+        self.assertEqual(self.table.status, 'available')
+
+    def test_checkout_settles_every_open_order_on_the_table(self):
+        second = Order.objects.create(table=self.table, status='ready', total_amount=500)
+        self.assertEqual(self.client.get(f'/checkout/{self.table.id}/').json(), {'status': 'success'})
+
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(Table.objects.get(pk=self.table.pk).status, 'available')
+        self.assertEqual(SalesRollup.summary(timezone.localdate(), timezone.localdate())['total_sales'], Decimal('1499'))
+
+
+# --- RECEIPTS ---
+class ReceiptTests(PosTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table=self.table, total_amount=2888)
+        OrderItem.objects.create(order=self.order, menu_item=self.boti, quantity=2, price=999)
+        OrderItem.objects.create(order=self.order, menu_item=self.kabab, quantity=1, price=890)
+
+    def test_open_order_is_rendered_live_with_prefetching(self):
+        with self.assertNumQueries(4):  # stored receipt?, order + table, items, menu items
+            response = self.client.get(f'/bill/{self.order.id}/')
+        self.assertContains(response, self.kabab.name)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_receipts_are_rendered_on_first_fetch_not_on_settle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.transition('completed')
+        self.assertFalse(Receipt.objects.exists())
+
+        self.client.get(f'/invoice/{self.order.id}/')
+        self.assertEqual(Receipt.objects.filter(order=self.order, kind='invoice').count(), 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/invoice/{self.order.id}/')
+        self.assertContains(response, self.boti.name)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+        again = self.client.get(f'/invoice/{self.order.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_voiding_a_sale_drops_its_receipts(self):
+        self.order.transition('completed')
+        self.client.get(f'/bill/{self.order.id}/')
+        self.order.transition('cancelled')
+        self.assertFalse(Receipt.objects.exists())
+        self.assertIn('no-cache', self.client.get(f'/bill/{self.order.id}/')['Cache-Control'])
+
+    def test_older_completed_orders_are_stored_on_first_view(self):
+        Order.objects.filter(pk=self.order.pk).update(status='completed')
+        self.client.get(f'/bill/{self.order.id}/')
+        self.assertTrue(Receipt.objects.filter(order=self.order, kind='bill').exists())
+        self.assertEqual(self.client.get('/invoice/0/').status_code, 404)
+
+
+# --- SALES REPORT PAGING ---
+class SalesReportPagingTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('manager', password='secret'))
+
+    def completed_orders(self, count):
+        orders = [Order.objects.create(table=self.table, total_amount=100) for _ in range(count)]
+        for order in orders:
+            order.transition('completed')
+        return orders
+
+    def test_first_page_then_older_rows_by_keyset(self):
+        orders = self.completed_orders(views.REPORT_PAGE_SIZE + 5)
+        with self.assertNumQueries(4):  # user (the session is cached), delta cursor, one page with tables, totals
+            response = self.client.get('/report/')
+        self.assertEqual(len(response.context['orders']), views.REPORT_PAGE_SIZE)
+        self.assertContains(response, f'data-order-id="{orders[-1].id}"')
+        self.assertNotContains(response, f'data-order-id="{orders[0].id}"')
+
+        older = self.client.get('/report/orders.json', {'before': response.context['older_cursor']}).json()
+        self.assertEqual([row['id'] for row in older['orders']], [o.id for o in reversed(orders[:5])])
+        self.assertIsNone(older['next'])
+
+    def test_page_and_delta_default_to_the_local_day(self):
+        # 01:00 in Karachi is still the previous day in UTC
+        early = timezone.make_aware(datetime(2026, 3, 2, 1, 0))
+        with mock.patch('django.utils.timezone.now', return_value=early):
+            self.assertEqual(self.client.get('/report/').context['selected_date'], date(2026, 3, 2))
+
+    def test_delta_returns_only_changed_rows(self):
+        earlier = Order.objects.create(table=self.table, total_amount=250)
+        self.completed_orders(3)
+        Order.objects.update(status_changed_at=timezone.now() - timedelta(hours=1))
+        cursor = self.client.get('/report/').context['delta_cursor']
+
+        earlier.transition('completed')  # placed before the page was rendered, settled after
+        delta = self.client.get('/report/orders.json', {'since': cursor}).json()
+        self.assertEqual([row['id'] for row in delta['orders']], [earlier.id])
+        self.assertIn('Rs. 250', delta['orders'][0]['html'])
+        self.assertEqual(delta['order_count'], 4)
+        self.assertEqual(self.client.get('/report/orders.json', {'since': 'nope'}).status_code, 400)
+
+        # Stamped before the last delta, committed after it: still picked up
+        late = Order.objects.create(table=self.table, total_amount=100)
+        late.transition('completed')
+        Order.objects.filter(pk=late.pk).update(status_changed_at=earlier.status_changed_at - timedelta(seconds=1))
+        again = self.client.get('/report/orders.json', {'since': delta['cursor']}).json()
+        self.assertEqual([row['id'] for row in again['orders']], [late.id, earlier.id])
+
+        # Once the window has passed the cursor moves beyond them
+        later = timezone.now() + views.REPORT_DELTA_OVERLAP * 2
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            settled = self.client.get('/report/orders.json', {'since': again['cursor']}).json()
+            self.assertEqual(self.client.get('/report/orders.json', {'since': settled['cursor']}).json()['orders'], [])
+
+
+# --- ANALYTICS ---
+class AnalyticsTests(PosTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('owner', password='secret'))
+        drinks = Category.objects.create(name="Drinks")
+        self.mint = MenuItem.objects.create(category=drinks, name="Mint Margarita", price=Decimal('450'))
+        self.today = timezone.localdate()
+        self.order([(self.boti, 2), (self.mint, 1)], payment_method='card')
+        self.order([(self.kabab, 1), (self.mint, 2)])
+        self.order([(self.boti, 5)], status='cancelled')
+
+    def order(self, lines, status='completed', **fields):
+        order = Order.objects.create(table=self.table, total_amount=sum(item.price * qty for item, qty in lines), **fields)
+        for item, qty in lines:
+            OrderItem.objects.create(order=order, menu_item=item, quantity=qty, price=item.price)
+        order.transition(status)
+        return order
+
+    def get(self, **params):
+        return self.client.get('/analytics/', params).json()
+
+    def test_item_rollup_follows_transitions(self):
+        self.assertEqual(ItemSalesRollup.objects.get(menu_item=self.mint).quantity, 3)
+        self.assertFalse(ItemSalesRollup.objects.filter(menu_item=self.boti, quantity=7).exists())
+        call_command('rebuild_sales_rollups', '--check', stdout=io.StringIO())
+
+    def test_revenue_by_category_and_payment_method(self):
+        categories = {row['key']: Decimal(row['revenue']) for row in self.get(dimension='category')['rows']}
+        self.assertEqual(categories, {'B.B.Q': Decimal('2888'), 'Drinks': Decimal('1350')})
+
+        methods = {row['key']: row for row in self.get(dimension='payment_method')['rows']}
+        self.assertEqual(Decimal(methods['card']['revenue']), Decimal('2448'))
+        self.assertEqual(methods['cash']['cancelled_count'], 1)
+
+    def test_top_items_are_ranked_in_the_database(self):
+        rows = self.get(dimension='item', top=2)['rows']
+        self.assertEqual([(row['key'], row['rank']) for row in rows], [('Malai Boti (10Pcs)', 1), ('Mint Margarita', 2)])
+        self.assertEqual(rows[1]['category_rank'], 1)
+
+    def test_pivot_by_day_without_pandas(self):
+        with mock.patch.object(analytics, 'pd', None):
+            payload = self.get(dimension='category', pivot='day', start=(self.today - timedelta(days=1)).isoformat())
+        self.assertEqual(payload['index'], [self.today.isoformat()])
+        self.assertEqual(payload['columns'], ['B.B.Q', 'Drinks'])
+        self.assertEqual(payload['values'], [[2888.0, 1350.0]])
+
+    def test_responses_are_cached_per_range_and_dimension(self):
+        self.get(dimension='hour')
+        with self.assertNumQueries(0):  # session and user come from their caches as well
+            self.get(dimension='hour')
+        self.assertEqual(self.client.get('/analytics/', {'dimension': 'table'}).status_code, 400)
+
+
+# --- ORDER ARCHIVE ---
+class OrderArchiveTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('owner', password='secret'))
+        self.old_day = timezone.localdate() - timedelta(days=200)
+        self.old = self.order('completed', days_ago=200)
+        self.old_open = self.order('pending', days_ago=200)
+        self.recent = self.order('completed', days_ago=1)
+
+    def order(self, status, days_ago):
+        order = Order.objects.create(table=self.table, total_amount=Decimal('2888'))
+        OrderItem.objects.create(order=order, menu_item=self.boti, quantity=2, price=self.boti.price)
+        OrderItem.objects.create(order=order, menu_item=self.kabab, quantity=1, price=self.kabab.price)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        if status != 'pending':
+            order.transition(status)
+        return order
+
+    def test_only_old_closed_orders_move(self):
+        call_command('archive_orders', '--dry-run', stdout=io.StringIO())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+        call_command('archive_orders', '--batch-size=1', stdout=io.StringIO())
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(archived.id, self.old.id)
+        self.assertEqual(archived.items.count(), 2)
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.old_open.id, self.recent.id})
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old.id).exists())
+        self.assertEqual(OrderHistory.objects.count(), 3)
+
+    def test_reports_read_through_the_archive(self):
+        call_command('archive_orders', stdout=io.StringIO())
+        call_command('rebuild_sales_rollups', '--check', stdout=io.StringIO())
+
+        response = self.client.get('/report/', {'date': self.old_day.isoformat()})
+        self.assertEqual([order.id for order in response.context['orders']], [self.old.id])
+        self.assertEqual(response.context['total_sales'], Decimal('2888'))
+
+        bill = self.client.get(f'/bill/{self.old.id}/')
+        self.assertContains(bill, 'Malai Boti')
+        self.assertEqual(self.client.get(f'/bill/{self.old.id}/', HTTP_IF_NONE_MATCH=bill['ETag']).status_code, 304)
+
+        rows = list(export.export_rows('orders', start=self.old_day, end=self.old_day, statuses=['completed']))
+        self.assertEqual([row[0] for row in rows], [self.old.id])
+
+
+# --- PRINT QUEUE ---
+class PrintQueueTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+        drinks = Category.objects.create(name="Drinks")
+        self.mint = MenuItem.objects.create(category=drinks, name="Mint Margarita", price=Decimal('450'))
+        self.spool = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool.cleanup)
+        stations = {
+            'kitchen': {'device': os.path.join(self.spool.name, 'kitchen.prn'), 'format': 'text'},
+            'bar': {'device': os.path.join(self.spool.name, 'bar.prn'), 'format': 'escpos', 'categories': ['Drinks']},
+            'counter': {'device': os.path.join(self.spool.name, 'counter.prn'), 'format': 'text'},
+        }
+        patcher = override_settings(POS_STATIONS=stations)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def read(self, station):
+        with open(os.path.join(self.spool.name, f'{station}.prn'), 'rb') as printer:
+            return printer.read()
+
+    def test_order_enqueues_one_ticket_per_station(self):
+        self.post_order(cart=[{'id': self.boti.id, 'quantity': 2}, {'id': self.mint.id, 'quantity': 1}])
+        jobs = PrintJob.objects.order_by('station')
+        self.assertEqual([(job.station, job.status) for job in jobs], [('bar', 'queued'), ('kitchen', 'queued')])
+
+        call_command('print_worker', '--once', stdout=io.StringIO())
+        self.assertEqual(set(PrintJob.objects.values_list('status', flat=True)), {'printed'})
+        kitchen, bar = self.read('kitchen'), self.read('bar')
+        self.assertIn(b'2 x Malai Boti', kitchen)
+        self.assertNotIn(b'Mint', kitchen)
+        self.assertTrue(bar.startswith(b'\x1b@'))
+        self.assertIn(b'1 x Mint Margarita', bar)
+
+    def test_failed_station_is_retried_with_backoff(self):
+        stations = dict(settings.POS_STATIONS, kitchen={'device': 'tcp://127.0.0.1:9'})
+        self.post_order()
+        with override_settings(POS_STATIONS=stations), self.assertLogs('pos.printing', 'WARNING'):
+            self.assertEqual(printing.run_once(), (0, 1))
+        job = PrintJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertTrue(job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(printing.run_once(), (0, 0))  # not due yet
+
+        PrintJob.objects.update(attempts=PrintJob.MAX_ATTEMPTS - 1, run_after=timezone.now())
+        with override_settings(POS_STATIONS=stations), self.assertLogs('pos.printing', 'WARNING'):
+            printing.run_once()
+        self.assertEqual(PrintJob.objects.get().status, 'failed')
+        self.assertEqual(self.client.get('/print-queue/').json()['counts']['kitchen'], {'failed': 1})
+
+        self.client.post(f'/print-queue/{job.id}/retry/')
+        self.assertEqual(printing.run_once(), (1, 0))
+
+    def test_receipts_go_to_the_counter_over_tcp(self):
+        received = []
+
+        class Printer(socketserver.BaseRequestHandler):
+            def handle(self):
+                while chunk := self.request.recv(65536):
+                    received.append(chunk)
+
+        server = socketserver.TCPServer(('127.0.0.1', 0), Printer)
+        printer = threading.Thread(target=server.handle_request, daemon=True)
+        printer.start()
+        self.addCleanup(server.server_close)
+        stations = dict(settings.POS_STATIONS, counter={'device': f'tcp://127.0.0.1:{server.server_address[1]}'})
+
+        order = Order.objects.create(table=self.table, total_amount=Decimal('999'))
+        OrderItem.objects.create(order=order, menu_item=self.boti, quantity=1, price=self.boti.price)
+        self.assertEqual(self.client.post(f'/print-receipt/{order.id}/').status_code, 200)
+        with override_settings(POS_STATIONS=stations):
+            self.assertEqual(printing.run_once(), (1, 0))
+        printer.join(5)
+        self.assertIn(b'TOTAL Rs.', b''.join(received))
+
+
+# --- BRANCH SYNC ---
+@override_settings(POS_BRANCH='gulberg', POS_SYNC_TOKEN='secret')
+class BranchSyncTests(PosTestCase):
+    """One database plays both the branch and head office; they talk over the test client."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+        self.head_office = Client()
+        self.batches = []
+
+    def send(self, url, body):
+        self.batches.append(body)
+        return self.head_office.post(url, body, content_type='application/json',
+                                     headers={'Content-Encoding': 'gzip', 'Authorization': 'Bearer secret'}).json()
+
+    def ship(self):
+        return sync.ship('/sync/ingest/', batch_size=3, send=self.send, settle=timedelta(0))
+
+    def assertConverged(self):
+        for model in (Order, OrderItem, Shift, Expense):
+            name = model._meta.model_name
+            branch = {row['id']: json.loads(json.dumps(row, cls=DjangoJSONEncoder)) for row in model.objects.values()}
+            office = dict(BranchRecord.objects.filter(branch='gulberg', model=name).values_list('object_id', 'data'))
+            self.assertEqual(office, branch, name)
+
+    def test_branch_converges_with_head_office(self):
+        self.client.post('/shift/', {'action': 'start_shift', 'opening_cash': '5000'})
+        shift = Shift.objects.get()
+        order_id = self.post_order().json()['order_id']
+        self.client.get(f'/settle-order/{order_id}/')
+        self.client.post('/shift/', {'action': 'add_expense', 'description': 'Charcoal', 'amount': '150'})
+
+        self.assertEqual(self.ship(), ChangeLog.objects.count())
+        self.assertConverged()
+        self.assertEqual(BranchRecord.objects.get(model='shift').data['total_sales'], '2888.00')
+
+        # Only what changed since is shipped
+        sent = len(self.batches)
+        self.client.post('/shift/', {'action': 'close_shift', 'actual_cash': '6848'})
+        self.assertEqual(self.ship(), 1)
+        self.assertEqual(len(self.batches), sent + 1)
+        self.assertConverged()
+        self.assertEqual(BranchRecord.objects.get(model='shift', object_id=shift.id).data['is_active'], False)
+
+    def test_offline_branch_catches_up_and_resends_are_harmless(self):
+        order_id = self.post_order().json()['order_id']
+
+        def offline(url, body):
+            raise OSError('Network is unreachable')
+        with self.assertRaises(sync.SyncFailed):
+            sync.ship('/sync/ingest/', send=offline, settle=timedelta(0))
+        self.assertEqual(SyncCursor.objects.get().last_seq, 0)
+
+        self.ship()
+        first_batch = self.batches[0]
+        self.client.get(f'/settle-order/{order_id}/')
+        self.ship()
+        self.send('/sync/ingest/', first_batch)  # a reply lost on the way back: the branch sends it again
+        self.assertConverged()
+        self.assertEqual(BranchRecord.objects.get(model='order').data['status'], 'completed')
+
+    def test_recent_changes_wait_until_they_have_settled(self):
+        self.post_order()
+        earlier = ChangeLog.objects.order_by('id').last()
+        ChangeLog.objects.update(created_at=timezone.now() - sync.SETTLE * 2)
+        self.post_order()  # may still be in flight on another connection: held back
+
+        settled = ChangeLog.objects.filter(id__lte=earlier.id).count()
+        self.assertEqual(sync.ship('/sync/ingest/', send=self.send), settled)
+        self.assertEqual(SyncCursor.objects.get().last_seq, earlier.id)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + sync.SETTLE * 2):
+            sync.ship('/sync/ingest/', send=self.send)
+        self.assertConverged()
+
+    def test_orders_are_read_only_in_the_admin(self):
+        order_id = self.post_order().json()['order_id']
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('owner', password='secret'))
+        self.assertEqual(admin.get(f'/admin/pos/order/{order_id}/change/').status_code, 200)
+        response = admin.post(f'/admin/pos/order/{order_id}/change/', {'status': 'completed', 'total_amount': '1'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(admin.get('/admin/pos/orderitem/add/').status_code, 403)
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'pending')
+
+    def test_ingest_needs_the_token(self):
+        body = sync.encode_batch('gulberg', [])
+        self.assertEqual(self.head_office.post('/sync/ingest/', body, content_type='application/json').status_code, 403)
+
+    def test_ingest_rejects_a_malformed_change(self):
+        body = json.dumps({'branch': 'gulberg', 'changes': [{'model': 'order', 'object_id': 1, 'data': {}}]})
+        response = self.head_office.post('/sync/ingest/', body, content_type='application/json',
+                                         headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'status': 'error', 'message': 'Invalid batch'})
+        self.assertFalse(BranchRecord.objects.exists())
+
+
+# --- KITCHEN ALL-DAY ---
+class KitchenAllDayTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('chef', password='secret'))
+        drinks = Category.objects.create(name="Drinks")
+        self.mint = MenuItem.objects.create(category=drinks, name="Mint Margarita", price=Decimal('450'))
+
+    def order(self, *lines, status='pending'):
+        order = Order.objects.create(table=self.table, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=item, quantity=qty, price=item.price) for item, qty in lines
+        ])
+
+    def all_day(self, **params):
+        return {row['name']: row['quantity'] for row in self.client.get('/kitchen/all-day.json', params).json()['items']}
+
+    def test_pending_quantities_are_summed_per_item_and_station(self):
+        self.order((self.boti, 2), (self.mint, 1))
+        self.order((self.boti, 3), (self.kabab, 1))
+        self.order((self.boti, 9), status='ready')
+
+        self.assertEqual(self.all_day(), {'Malai Boti (10Pcs)': 5, 'Chicken Kabab (4Pcs)': 1, 'Mint Margarita': 1})
+        self.assertEqual(self.all_day(station='kitchen'), {'Malai Boti (10Pcs)': 5, 'Chicken Kabab (4Pcs)': 1})
+        self.assertEqual(self.all_day(station='bar'), {'Mint Margarita': 1})
+        self.assertContains(self.client.get('/kitchen/', {'station': 'bar'}), 'all-day-qty">1<')
+
+    def test_cost_does_not_grow_with_open_orders(self):
+        self.order((self.boti, 1))
+        self.all_day(station='kitchen')  # the session user is cached from here on
+        with CaptureQueriesContext(connection) as few:
+            self.all_day(station='kitchen')
+        for _ in range(20):
+            self.order((self.boti, 1), (self.kabab, 2))
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.all_day(station='kitchen'), {'Malai Boti (10Pcs)': 21, 'Chicken Kabab (4Pcs)': 40})
+        self.assertEqual(len(many), len(few))
+
+
+# --- CUSTOMERS ---
+class CustomerTests(PosTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+
+    def takeaway(self, phone, name='Ali'):
+        order_id = self.post_order(order_type='takeaway', customer_name=name, customer_phone=phone).json()['order_id']
+        self.client.get(f'/settle-order/{order_id}/')
+        return order_id
+
+    def test_orders_link_to_one_customer_per_phone(self):
+        first = self.takeaway('+92 300-1234567')
+        self.takeaway('0300 1234567', name='Ali Raza')
+        customer = Customer.objects.get()
+        self.assertEqual((customer.phone, customer.name), ('03001234567', 'Ali Raza'))
+        self.assertEqual((customer.visit_count, customer.lifetime_spend), (2, Decimal('5776')))
+        self.assertEqual(customer.last_order_at, Order.objects.latest('id').created_at)
+        self.assertEqual(Order.objects.get(id=first).customer_phone, '+92 300-1234567')
+
+        self.client.get(f'/cancel-order/{first}/')
+        customer.refresh_from_db()
+        self.assertEqual((customer.visit_count, customer.lifetime_spend), (1, Decimal('2888')))
+
+        self.post_order()  # dine-in, no phone
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_prefix_search_uses_the_phone_index(self):
+        for phone in ('03001234567', '03009999999', '03011234567', '03111234567'):
+            Customer.objects.create(phone=phone)
+        search = lambda q: [c['phone'] for c in self.client.get('/customers/search/', {'q': q}).json()['customers']]
+        self.assertEqual(search('0300'), ['03001234567', '03009999999'])
+        self.assertEqual(search('030099'), ['03009999999'])
+        self.assertEqual(search('+92 30'), ['03001234567', '03009999999', '03011234567'])
+        self.assertEqual(search('abc'), [])
+
+        sql, params = Customer.search('0300').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+
+    def test_history_includes_archived_orders(self):
+        old = self.takeaway('03001234567')
+        Order.objects.filter(id=old).update(created_at=timezone.now() - timedelta(days=400))
+        recent = self.takeaway('03001234567')
+        call_command('archive_orders', stdout=io.StringIO())
+
+        customer = Customer.objects.get()
+        detail = self.client.get(f'/customers/{customer.id}/').json()
+        self.assertEqual([order['id'] for order in detail['orders']], [recent, old])
+        self.assertEqual(detail['visit_count'], 2)
+        self.assertEqual(self.client.get('/customers/0/').status_code, 404)
+
+
+# --- DEVICE TOKENS ---
+class DeviceTokenTests(PosTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('kitchen', password='secret')
+        self.code = DeviceToken.issue('Kitchen screen', self.user)
+
+    def pair(self, code=None, client=None):
+        response = (client or self.client).get(f'/pair/{code or self.code}/')
+        self.assertRedirects(response, '/kitchen/', fetch_redirect_response=False)
+        return response.cookies['pos_device'].value
+
+    def test_pairing_link_works_once_and_only_sets_a_cookie(self):
+        token = self.pair()
+        self.assertNotIn(token, self.code)
+        self.assertEqual(DeviceToken.objects.get().key_hash, DeviceToken.hash(token))
+        self.assertEqual(self.client.get(f'/pair/{self.code}/').status_code, 404)
+
+        expired = DeviceToken.issue('Bar screen', self.user)
+        DeviceToken.objects.filter(name='Bar screen').update(pairing_expires=timezone.now())
+        self.assertEqual(Client().get(f'/pair/{expired}/').status_code, 404)
+        response = Client().get(f'/pair/{DeviceToken.issue("Tables", self.user)}/', {'next': 'https://evil.example/'})
+        self.assertRedirects(response, '/kitchen/', fetch_redirect_response=False)
+
+    def test_screen_signs_in_by_cookie_and_skips_the_session(self):
+        token = self.pair()
+        self.assertEqual(self.client.get('/kitchen/').status_code, 200)
+        # No session or user row is read, only the all-day query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/kitchen/all-day.json').status_code, 200)
+        self.assertEqual(Client().get('/tables/', HTTP_AUTHORIZATION=f'Device {token}').status_code, 200)
+        # Not from the URL, where it would be logged
+        self.assertEqual(Client().get('/kitchen/', {'device': token}).status_code, 302)
+
+    def test_token_only_opens_screen_views(self):
+        self.pair()
+        self.assertEqual(self.client.get('/report/').status_code, 302)
+        self.assertEqual(Client().get('/kitchen/', HTTP_AUTHORIZATION='Device wrong').status_code, 302)
+
+    def test_unknown_tokens_are_not_cached(self):
+        for i in range(5):
+            Client().get('/kitchen/', HTTP_AUTHORIZATION=f'Device made-up-{i}')
+        self.assertEqual(len(auth.devices), 0)
+
+        cache = auth.TimedCache(60, maxsize=2)
+        for key in 'abc':
+            cache.get(key, lambda: key.upper())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('missing', lambda: None))
+        self.assertEqual(len(cache), 2)
+
+    def test_revoked_token_and_inactive_user_are_refused(self):
+        self.pair()
+        self.assertEqual(self.client.get('/kitchen/').status_code, 200)
+        call_command('create_device_token', 'Kitchen screen', user='kitchen', revoke=True, stdout=io.StringIO())
+        self.assertEqual(self.client.get('/kitchen/').status_code, 302)
+
+        self.pair(DeviceToken.issue('Kitchen screen 2', self.user))
+        self.assertEqual(self.client.get('/kitchen/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/kitchen/').status_code, 302)
+
+    def test_session_user_is_cached_until_it_changes(self):
+        self.client.force_login(self.user)
+        self.client.get('/kitchen/all-day.json')
+        # Session from the cache, user from process memory: only the all-day query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/kitchen/all-day.json').status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get('/tables/').status_code, 302)
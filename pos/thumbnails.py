@@ -0,0 +1,52 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Menu cards are 140px tall; these cover 1x-3x displays for the widest card
+THUMBNAIL_WIDTHS = (160, 320, 480)
+THUMBNAIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+
+def thumbnail_name(name, width, ext):
+    """menu_items/boti.png -> menu_items/boti_320w.webp (next to the original)."""
+    stem, _ = os.path.splitext(name)
+    return f"{stem}_{width}w.{ext}"
+
+
+def srcset(name, ext):
+    return ', '.join(
+        f"{default_storage.url(thumbnail_name(name, width, ext))} {width}w" for width in THUMBNAIL_WIDTHS
+    )
+
+
+def generate_thumbnails(name, force=False):
+    """Write every width/format bucket for one stored image; returns how many were written."""
+    targets = [
+        (width, ext, fmt, thumbnail_name(name, width, ext))
+        for width in THUMBNAIL_WIDTHS for ext, fmt in THUMBNAIL_FORMATS.items()
+    ]
+    if not force:
+        targets = [target for target in targets if not default_storage.exists(target[3])]
+    if not targets:
+        return 0
+
+    with default_storage.open(name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert('RGB')
+
+    for width, ext, fmt, target in targets:
+        thumb = image.copy()
+        # Never upscale; keep the aspect ratio
+        thumb.thumbnail((width, image.height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumb.save(buffer, fmt, quality=80, optimize=True)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+    return len(targets)
@@ -9,9 +9,15 @@ urlpatterns = [
     # POS
     path('', views.pos_dashboard, name='pos_dashboard'),
     path('place-order/', views.place_order, name='place_order'),
+    path('place-orders/', views.place_orders_bulk, name='place_orders_bulk'),
+    path('menu.json', views.menu_json, name='menu_json'),
+
+    path('customers/search/', views.customer_search, name='customer_search'),
+    path('customers/<int:customer_id>/', views.customer_detail, name='customer_detail'),
 
     # Kitchen
     path('kitchen/', views.kitchen_dashboard, name='kitchen_dashboard'),
+    path('kitchen/all-day.json', views.kitchen_all_day, name='kitchen_all_day'),
     path('order-status/<int:order_id>/<str:new_status>/', views.update_order_status, name='update_order_status'),
 
     # Manager / Tables
@@ -23,9 +29,33 @@ urlpatterns = [
 
     # Reports
     path('report/', views.sales_dashboard, name='sales_dashboard'),
+    path('report/orders.json', views.report_orders, name='report_orders'),
+    path('analytics/', views.analytics_api, name='analytics'),
+
+    path('export/', views.export_orders, name='export_orders'),
+
+    # Shift
+    path('shift/', views.shift_dashboard, name='shift_dashboard'),
 
     path('bill/<int:order_id>/', views.generate_bill, name='generate_bill'),
     path('order-success/<int:order_id>/', views.order_success, name='order_success'),
     path('invoice/<int:order_id>/', views.digital_bill, name='digital_bill'),
     path('cancel-order/<int:order_id>/', views.cancel_order, name='cancel_order'),
+
+    # Live updates for kitchen / manager / report screens
+    path('events/', views.event_stream, name='event_stream'),
+
+    # Print queue (jobs are printed by "manage.py print_worker")
+    path('print-queue/', views.print_queue, name='print_queue'),
+    path('print-queue/<int:job_id>/retry/', views.retry_print_job, name='retry_print_job'),
+    path('print-receipt/<int:order_id>/', views.print_receipt, name='print_receipt'),
+
+    # Head office: batches from each branch's "manage.py sync_branch"
+    path('sync/ingest/', views.sync_ingest, name='sync_ingest'),
+
+    # Always-on screens: one-time link that leaves a device token cookie
+    path('pair/<str:code>/', views.pair_device, name='pair_device'),
+
+    # Prometheus scrape target (staff or POS_METRICS_TOKEN)
+    path('metrics', views.metrics, name='metrics'),
 ]
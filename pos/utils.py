@@ -0,0 +1,34 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+
+def local_day_range(day, last_day=None):
+    # [start, end) covering day..last_day (inclusive) in the restaurant's timezone
+    last_day = last_day or day
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    return start, end
+
+
+def parse_date(value, default=None):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return default
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(moment, pk):
+    # "<microseconds since epoch>-<id>": exact, opaque and URL-safe
+    return f"{(moment - EPOCH) // timedelta(microseconds=1)}-{pk}"
+
+
+def decode_cursor(value):
+    try:
+        micros, pk = value.split('-')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError):
+        return None
@@ -1,14 +1,31 @@
-from datetime import datetime
+from datetime import timedelta
+import hmac
 import json
+import logging
+import uuid
 from decimal import Decimal
 from django.utils import timezone
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, url_has_allowed_host_and_scheme
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, F
-from .models import Category, MenuItem, Table, Order, OrderItem, Shift, Expense
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F, Prefetch, Q
+from . import analytics, events, export, printing, sync
+from .menu import get_menu
+from .middleware import DeviceTokenMiddleware, registry
+from .routers import read_replica
+from .utils import EPOCH, decode_cursor, encode_cursor, local_day_range, parse_date
+from .models import ChangeLog, Customer, DeviceToken, InvalidTransition, MenuItem, MenuVersion, Table, Order, OrderHistory, OrderItem, PrintJob, Receipt, Shift, SalesRollup
+
+logger = logging.getLogger('pos.orders')
 
 # --- 1. AUTHENTICATION ---
 def custom_login(request):
@@ -32,97 +49,194 @@ def user_logout(request):
 # --- 2. POS DASHBOARD ---
 @login_required(login_url='/login/')
 def pos_dashboard(request):
-    categories = Category.objects.all()
-    menu_items = MenuItem.objects.filter(is_available=True)
     tables = Table.objects.all()
     return render(request, 'pos/index.html', {
-        'categories': categories,
-        'menu_items': menu_items,
+        'menu': get_menu(),
         'tables': tables,
     })
 
-# --- 3. PLACE ORDER API ---
-@csrf_exempt
-def place_order(request):
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            cart = data.get('cart')
-            order_type = data.get('order_type')
-            payment_method = data.get('payment_method', 'cash')
-
-            customer_name = data.get('customer_name', '')
-            customer_phone = data.get('customer_phone', '')
+def menu_etag(request):
+    return f'menu-{MenuVersion.current()}'
 
-            cash_given_str = data.get('cash_given', '0')
-            if not cash_given_str: cash_given_str = '0'
-            cash_given = Decimal(str(cash_given_str))
+@login_required(login_url='/login/')
+@condition(etag_func=menu_etag)
+def menu_json(request):
+    # Tills revalidate with If-None-Match and get a 304 until the menu changes
+    return HttpResponse(get_menu()['json'], content_type='application/json')
 
-            if not cart:
-                return JsonResponse({'status': 'error', 'message': 'Cart is empty'}, status=400)
+# --- 3. PLACE ORDER API ---
+class OrderRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def ingest_order(data):
+    """Validate and write one order payload; returns (order, created).
+
+    A payload carrying a ``client_uuid`` that was already stored returns the
+    existing order instead of creating a duplicate (till retries / offline queue).
+    """
+    if not isinstance(data, dict):
+        raise OrderRejected('Invalid order payload')
+    order_type = data.get('order_type')
+    payment_method = data.get('payment_method', 'cash')
+
+    customer_name = data.get('customer_name', '')
+    customer_phone = data.get('customer_phone', '')
+
+    # Everything that can't parse is rejected here, before any write, so the
+    # till drops it instead of resending an order that can never go through
+    try:
+        cash_given = Decimal(str(data.get('cash_given') or '0'))
+        cart = [(int(item['id']), int(item['quantity'])) for item in data.get('cart') or ()]
+        table_id = int(data['table_id']) if order_type == 'dine-in' and data.get('table_id') else None
+    except (ArithmeticError, KeyError, TypeError, ValueError):
+        raise OrderRejected('Invalid order payload')
+    if not cash_given.is_finite() or cash_given < 0 or any(quantity < 1 for _, quantity in cart):
+        raise OrderRejected('Invalid order payload')
+
+    client_uuid = data.get('client_uuid') or None
+    if client_uuid:
+        try:
+            client_uuid = uuid.UUID(str(client_uuid))
+        except ValueError:
+            raise OrderRejected('Invalid client_uuid')
+
+    if not cart:
+        raise OrderRejected('Cart is empty')
+
+    if order_type == 'dine-in' and not table_id:
+        raise OrderRejected('Table required')
+
+    # Takeaway Check
+    if order_type == 'takeaway' and not customer_name:
+        raise OrderRejected('Name required for Takeaway')
+
+    # Price every line from one query (unknown items are skipped); the category routes the KOT
+    menu_items = MenuItem.objects.select_related('category').in_bulk([item_id for item_id, _ in cart])
+    lines = []
+    total = Decimal('0.00')
+    for item_id, quantity in cart:
+        menu_item = menu_items.get(item_id)
+        if menu_item is None:
+            continue
+        lines.append(OrderItem(menu_item=menu_item, quantity=quantity, price=menu_item.price))
+        total += (menu_item.price * quantity)
+
+    # Calculate Change
+    if payment_method == 'cash':
+        change_due = cash_given - total if cash_given >= total else Decimal('0.00')
+    else:
+        change_due = Decimal('0.00')
+        cash_given = total
 
+    try:
+        with transaction.atomic():
             # Table Logic
-            table = None
-            if order_type == 'dine-in':
-                table_id = data.get('table_id')
-                if not table_id:
-                    return JsonResponse({'status': 'error', 'message': 'Table required'}, status=400)
-                try:
-                    table = Table.objects.get(id=table_id)
-                    table.status = 'occupied'
-                    table.save()
-                except Table.DoesNotExist:
-                    return JsonResponse({'status': 'error', 'message': 'Table not found'}, status=404)
-
-            # Takeaway Check
-            if order_type == 'takeaway' and not customer_name:
-                return JsonResponse({'status': 'error', 'message': 'Name required for Takeaway'}, status=400)
+            if table_id:
+                if not Table.objects.filter(id=table_id).update(status='occupied'):
+                    raise OrderRejected('Table not found', status=404)
 
             # Create Order
             order = Order.objects.create(
-                table=table,
+                client_uuid=client_uuid,
+                customer=Customer.for_order(customer_phone, customer_name),
+                table_id=table_id,
                 order_type=order_type,
                 payment_method=payment_method,
                 customer_name=customer_name,
                 customer_phone=customer_phone,
                 cash_given=cash_given,
+                change_due=change_due,
                 status='pending',
-                total_amount=0
+                total_amount=total
             )
 
             # Save Items
-            total = Decimal('0.00')
-            for item in cart:
-                try:
-                    menu_item = MenuItem.objects.get(id=item['id'])
-                    quantity = int(item['quantity'])
-                    price = menu_item.price
-                    OrderItem.objects.create(order=order, menu_item=menu_item, quantity=quantity, price=price)
-                    total += (price * quantity)
-                except MenuItem.DoesNotExist:
-                    continue
-
-            order.total_amount = total
-
-            # Calculate Change
-            if payment_method == 'cash':
-                if cash_given >= total:
-                    order.change_due = cash_given - total
-                else:
-                    order.change_due = Decimal('0.00')
-            else:
-                order.change_due = Decimal('0.00')
-                order.cash_given = total
-
-            order.save()
-            return JsonResponse({'status': 'success', 'order_id': order.id})
+            for line in lines:
+                line.order = order
+            OrderItem.objects.bulk_create(lines)
+
+            # Printed by the print worker, not here: the till gets its answer straight away
+            PrintJob.enqueue_kot(order, lines)
+            ChangeLog.record(order, *lines)
+
+            events.publish(
+                'order.created',
+                id=order.id,
+                order_type=order.order_type,
+                table_id=order.table_id,
+                customer_name=order.customer_name,
+                total=str(order.total_amount),
+                time=timezone.localtime(order.created_at).strftime('%H:%M'),
+                items=[[line.quantity, line.menu_item.name] for line in lines],
+            )
+    except IntegrityError:
+        # Same client_uuid already stored: this is a retry, hand back the original
+        existing = Order.objects.filter(client_uuid=client_uuid).first() if client_uuid else None
+        if existing is None:
+            raise
+        return existing, False
+
+    return order, True
+
+@csrf_exempt
+def place_order(request):
+    if request.method == 'POST':
+        try:
+            order, created = ingest_order(json.loads(request.body))
+            return JsonResponse({'status': 'success', 'order_id': order.id, 'duplicate': not created})
 
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        except OrderRejected as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+        except OperationalError as e:
+            # Database busy or unreachable: the till keeps the order and resends it
+            logger.warning("place_order will be retried: %s", e)
+            return JsonResponse({'status': 'error', 'message': str(e), 'retry': True}, status=503)
         except Exception as e:
-            print(f"Error in place_order: {e}")
+            logger.exception("place_order failed")
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
+MAX_ORDER_BATCH = 100
+
+@csrf_exempt
+def place_orders_bulk(request):
+    # Flush target for the till's offline queue: many orders, one request, one commit
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    try:
+        orders = json.loads(request.body).get('orders') or []
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if len(orders) > MAX_ORDER_BATCH:
+        return JsonResponse({'status': 'error', 'message': f'At most {MAX_ORDER_BATCH} orders per batch'}, status=400)
+
+    results = []
+    with transaction.atomic():
+        for data in orders:
+            result = {'client_uuid': data.get('client_uuid') if isinstance(data, dict) else None}
+            try:
+                # A savepoint per order, so one failure can't break the rest of the batch
+                with transaction.atomic():
+                    order, created = ingest_order(data)
+                result.update(status='success', order_id=order.id, duplicate=not created)
+            except OrderRejected as e:
+                result.update(status='error', message=str(e))
+            except OperationalError as e:
+                # Only a transient database error is worth resending
+                logger.warning("place_orders_bulk will be retried: %s", e)
+                result.update(status='error', message=str(e), retry=True)
+            except Exception as e:
+                logger.exception("place_orders_bulk failed for %s", result['client_uuid'])
+                result.update(status='error', message=str(e))
+            results.append(result)
+
+    return JsonResponse({'status': 'success', 'results': results})
+
 # --- 4. SUCCESS PAGE ---
 @login_required(login_url='/login/')
 def order_success(request, order_id):
@@ -134,147 +248,281 @@ def order_success(request, order_id):
 
 # --- 5. KITCHEN ---
 @login_required(login_url='/login/')
-def kitchen_dashboard(request):
-    pending_orders = Order.objects.filter(status='pending').order_by('created_at').prefetch_related('items__menu_item')
-    return render(request, 'pos/kitchen.html', {'orders': pending_orders})
+@read_replica
+async def kitchen_dashboard(request):
+    # Async so a wall of kitchen screens doesn't hold a thread each; everything
+    # the template touches is fetched here, as templates can't query from async code
+    pending = Order.objects.filter(status='pending').order_by('created_at').select_related('table').prefetch_related('items__menu_item')
+    pending_orders = [order async for order in pending]
+    table_names = {table_id: name async for table_id, name in Table.objects.values_list('id', 'name')}
+    station = kitchen_station(request)
+    return render(request, 'pos/kitchen.html', {
+        'orders': pending_orders,
+        'table_names': table_names,
+        'all_day': await all_day_rows(station),
+        'station': station,
+        'stations': list(settings.POS_STATIONS),
+    })
+
+def kitchen_station(request):
+    station = request.GET.get('station')
+    return station if station in settings.POS_STATIONS else None
 
-def update_order_status(request, order_id, new_status):
+async def all_day_rows(station):
+    return [
+        {'id': row['menu_item'], 'name': row['menu_item__name'],
+         'category': row['menu_item__category__name'], 'quantity': row['quantity']}
+        async for row in OrderItem.all_day(station)
+    ]
+
+@login_required(login_url='/login/')
+async def kitchen_all_day(request):
+    # ?station=<name>: what that station still has to cook, summed over every pending order.
+    # From the primary: the screen calls this when an order event arrives, and a
+    # lagging replica would answer with the totals from before that event
+    station = kitchen_station(request)
+    return JsonResponse({'station': station, 'items': await all_day_rows(station)})
+
+async def update_order_status(request, order_id, new_status):
+    if new_status not in dict(Order.STATUSES):
+        return JsonResponse({'status': 'error', 'message': 'Unknown status'}, status=400)
     try:
-        order = Order.objects.get(id=order_id)
-        order.status = new_status
-        order.save()
+        order = await Order.objects.aget(id=order_id)
+        await order.atransition(new_status)
         return JsonResponse({'status': 'success'})
     except Order.DoesNotExist:
         return JsonResponse({'status': 'error'}, status=404)
+    except InvalidTransition as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
 
 # --- 6. MANAGER ---
 @login_required(login_url='/login/')
-def table_dashboard(request):
-    tables = Table.objects.all()
-    tables_data = []
-    for table in tables:
+@read_replica
+async def table_dashboard(request):
+    # One query for every table's open orders instead of one per occupied table
+    open_orders = Prefetch('order_set', queryset=Order.objects.filter(status__in=['pending', 'ready']).order_by('id'), to_attr='open_orders')
+    tables = Table.objects.prefetch_related(open_orders)
+    tables_data, open_orders = [], {}
+    async for table in tables:
         active_order = None
-        if table.status == 'occupied':
-            active_order = Order.objects.filter(table=table, status__in=['pending', 'ready']).last()
+        if table.status == 'occupied' and table.open_orders:
+            active_order = table.open_orders[-1]
         tables_data.append({'obj': table, 'active_order': active_order})
-
-    active_takeaways = Order.objects.filter(order_type='takeaway', status__in=['pending', 'ready']).order_by('-created_at')
-    return render(request, 'pos/tables.html', {'tables': tables_data, 'takeaways': active_takeaways})
+        # The page keeps these up to date from order.created / order.status / table.freed events
+        open_orders[table.id] = [
+            {'id': order.id, 'total': str(order.total_amount), 'customer_name': order.customer_name}
+            for order in table.open_orders
+        ]
+
+    takeaways = Order.objects.filter(order_type='takeaway', status__in=['pending', 'ready']).order_by('-created_at')
+    active_takeaways = [order async for order in takeaways]
+    return render(request, 'pos/tables.html', {
+        'tables': tables_data,
+        'takeaways': active_takeaways,
+        'open_orders': open_orders,
+    })
 
 def checkout_table(request, table_id):
     try:
         table = Table.objects.get(id=table_id)
-        if table.status == 'occupied':
-            order = Order.objects.filter(table=table, status__in=['pending', 'ready']).last()
-            if order:
-                order.status = 'completed'
-                order.save()
-            table.status = 'available'
-            table.save()
-            return JsonResponse({'status': 'success'})
     except Table.DoesNotExist:
         return JsonResponse({'status': 'error'}, status=404)
-    return JsonResponse({'status': 'error'}, status=400)
-
-def settle_order(request, order_id):
+    if table.status != 'occupied':
+        return JsonResponse({'status': 'error'}, status=400)
     try:
-        order = Order.objects.get(id=order_id)
-        order.status = 'completed'
-        order.save()
+        # Settle every open order on the table; closing the last one frees it
+        with transaction.atomic():
+            for order in Order.objects.filter(table=table, status__in=Order.OPEN_STATUSES).order_by('id'):
+                order.transition('completed')
+            # An occupied table with nothing open on it is just freed
+            if Table.objects.filter(id=table.id, status='occupied').update(status='available'):
+                events.publish('table.freed', id=table.id)
+    except InvalidTransition as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+    return JsonResponse({'status': 'success'})
+
+async def settle_order(request, order_id):
+    try:
+        order = await Order.objects.aget(id=order_id)
+        await order.atransition('completed')
         return JsonResponse({'status': 'success'})
     except Order.DoesNotExist:
         return JsonResponse({'status': 'error'}, status=404)
+    except InvalidTransition as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
 
 # --- 7. REPORTS (UPDATED TO SHOW CANCELLED ORDERS) ---
 @login_required(login_url='/login/')
-def sales_dashboard(request):
+@read_replica
+async def sales_dashboard(request):
     # 1. Date Logic
     date_str = request.GET.get('date')
-    if date_str:
-        try:
-            target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            target_date = timezone.now().date()
-    else:
-        target_date = timezone.now().date()
-
-    # 2. Filter Orders: Get ALL orders for the date (Completed AND Cancelled), exclude Pending
-    orders = Order.objects.filter(
-        created_at__date=target_date
-    ).exclude(status='pending').order_by('-created_at')
+    # The local day, as report_orders and the rollups use; UTC would be yesterday until 05:00 in Karachi
+    target_date = parse_date(date_str, timezone.localdate())
 
-    # 3. Calculate Totals (ONLY from Completed orders)
-    # We filter specifically for 'completed' here so Void orders don't add money
-    completed_orders = orders.filter(status='completed')
+    # 2. Filter Orders: the newest page of the day's orders (Completed AND Cancelled), exclude Pending.
+    # The live cursor is taken first so nothing changing meanwhile is missed
+    delta_cursor = await latest_status_change()
+    orders, older_cursor = await report_page(report_orders_for(target_date))
 
-    total_sales = completed_orders.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    order_count = completed_orders.count()
+    # 3. Totals (ONLY from Completed orders) come from the pre-aggregated rollup
+    totals = await SalesRollup.asummary(target_date, target_date)
 
     return render(request, 'pos/report.html', {
-        'total_sales': total_sales,
-        'order_count': order_count,
+        'total_sales': totals['total_sales'],
+        'order_count': totals['order_count'],
         'orders': orders, # Sends ALL orders (including void) to the list
+        'older_cursor': older_cursor,
+        'delta_cursor': delta_cursor,
         'selected_date': target_date
     })
 
+REPORT_PAGE_SIZE = 50
+REPORT_DELTA_LIMIT = 200
+# status_changed_at is stamped before commit, so a row can become visible after
+# rows stamped later. The delta cursor never passes now - this, and rows inside
+# the window are sent again (the page replaces them by id) until they age out.
+REPORT_DELTA_OVERLAP = timedelta(seconds=30)
+
+def report_orders_for(day):
+    # A plain created_at range (not __date) so the index can be used. Through the
+    # history view so days past the archive horizon still list their orders
+    day_start, day_end = local_day_range(day)
+    return OrderHistory.objects.filter(
+        created_at__gte=day_start, created_at__lt=day_end
+    ).exclude(status='pending').select_related('table')
+
+async def report_page(orders, before=None):
+    # Keyset pagination, newest first: (created_at, id) < cursor
+    if before:
+        created_at, pk = before
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    page = [order async for order in orders.order_by('-created_at', '-id')[:REPORT_PAGE_SIZE + 1]]
+    if len(page) <= REPORT_PAGE_SIZE:
+        return page, None
+    last = page[REPORT_PAGE_SIZE - 1]
+    return page[:REPORT_PAGE_SIZE], encode_cursor(last.created_at, last.id)
+
+async def latest_status_change():
+    latest = await (
+        Order.objects.filter(status_changed_at__isnull=False)
+        .order_by('-status_changed_at', '-id').values_list('status_changed_at', 'id').afirst()
+    )
+    return encode_cursor(*latest) if latest else encode_cursor(EPOCH, 0)
+
+def report_rows(orders):
+    return [
+        {'id': order.id, 'status': order.status, 'html': render_to_string('pos/report_row.html', {'order': order})}
+        for order in orders
+    ]
+
+@login_required(login_url='/login/')
+async def report_orders(request):
+    # From the primary: the page calls this when an order.status event arrives,
+    # and a lagging replica would answer with the state from before that event
+    # ?before=<cursor>: the next page of older rows. ?since=<cursor>: rows whose status changed since
+    target_date = parse_date(request.GET.get('date'), timezone.localdate())
+    orders = report_orders_for(target_date)
+
+    if 'since' not in request.GET:
+        before = decode_cursor(request.GET.get('before'))
+        page, older_cursor = await report_page(orders, before)
+        return JsonResponse({'orders': report_rows(page), 'next': older_cursor})
+
+    since = decode_cursor(request.GET['since'])
+    if since is None:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+    changed_at, pk = since
+    changed = orders.filter(
+        Q(status_changed_at__gt=changed_at) | Q(status_changed_at=changed_at, id__gt=pk)
+    ).order_by('status_changed_at', 'id')[:REPORT_DELTA_LIMIT]
+    changed = [order async for order in changed]
+    reached = (changed[-1].status_changed_at, changed[-1].id) if changed else since
+    horizon = (timezone.now() - REPORT_DELTA_OVERLAP, 0)
+    totals = await SalesRollup.asummary(target_date, target_date)
+    return JsonResponse({
+        'orders': report_rows(changed),
+        'cursor': encode_cursor(*min(reached, horizon)),
+        # Only page on while the rows are older than the window, or a busy window would loop
+        'more': len(changed) == REPORT_DELTA_LIMIT and reached < horizon,
+        'total_sales': str(totals['total_sales']),
+        'order_count': totals['order_count'],
+    })
+
+# A day rather than forever: a completed sale can still be voided
+RECEIPT_MAX_AGE = 60 * 60 * 24
+
 def generate_bill(request, order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-        return render(request, 'pos/bill.html', {'order': order})
-    except Order.DoesNotExist:
-        return HttpResponse("Order not found", status=404)
+    return receipt_response(request, order_id, 'bill') or HttpResponse("Order not found", status=404)
+
+def receipt_response(request, order_id, kind):
+    # Completed orders never change: serve the stored render, cacheable and revalidated by ETag
+    receipt = Receipt.objects.filter(order_id=order_id, kind=kind).only('html', 'etag').first()
+    if receipt is None:
+        order = Receipt.receipt_order(order_id)
+        if order is None:
+            # Archived orders lost their stored receipts; they are final, so render one to cache
+            order = Receipt.receipt_order(order_id, OrderHistory)
+            if order is None:
+                return None
+            html = Receipt.render(order, kind)
+            receipt = Receipt(html=html, etag=Receipt.etag_for(html))
+        elif order.status != 'completed':
+            response = HttpResponse(Receipt.render(order, kind))
+            patch_cache_control(response, no_cache=True)
+            return response
+        else:
+            # Completed before receipts were stored
+            receipt = Receipt.store(order, kind)
+
+    response = HttpResponse(receipt.html)
+    response['ETag'] = quote_etag(receipt.etag)
+    patch_cache_control(response, public=True, max_age=RECEIPT_MAX_AGE)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
 
 # --- 8. SHIFT MANAGEMENT ---
 @login_required(login_url='/login/')
 def shift_dashboard(request):
-    active_shift = Shift.objects.filter(is_active=True).last()
+    active_shift = Shift.current().first()
 
     if request.method == 'POST':
         action = request.POST.get('action')
 
         if action == 'start_shift':
             opening_cash = Decimal(request.POST.get('opening_cash', '0'))
-            Shift.objects.create(opening_cash=opening_cash, is_active=True)
+            with transaction.atomic():
+                ChangeLog.record(Shift.objects.create(opening_cash=opening_cash, is_active=True))
             return redirect('shift_dashboard')
 
         elif action == 'add_expense' and active_shift:
             desc = request.POST.get('description')
             amount = Decimal(request.POST.get('amount', '0'))
-            Expense.objects.create(shift=active_shift, description=desc, amount=amount)
+            active_shift.add_expense(desc, amount)
             return redirect('shift_dashboard')
 
         elif action == 'close_shift' and active_shift:
+            # Totals are already running on the shift: close it in a single UPDATE
             actual_cash = Decimal(request.POST.get('actual_cash', '0'))
-            orders = Order.objects.filter(created_at__gte=active_shift.start_time, status='completed')
-            total_sales = orders.aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
-            expenses = Expense.objects.filter(shift=active_shift)
-            total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-            calculated_cash = active_shift.opening_cash + total_sales - total_expenses
-            difference = actual_cash - calculated_cash
-
-            active_shift.end_time = timezone.now()
-            active_shift.total_sales = total_sales
-            active_shift.total_expenses = total_expenses
-            active_shift.calculated_cash = calculated_cash
-            active_shift.actual_cash = actual_cash
-            active_shift.difference = difference
-            active_shift.is_active = False
-            active_shift.save()
+            calculated_cash = F('opening_cash') + F('total_sales') - F('total_expenses')
+            with transaction.atomic():
+                Shift.objects.filter(pk=active_shift.pk, is_active=True).update(
+                    end_time=timezone.now(),
+                    calculated_cash=calculated_cash,
+                    actual_cash=actual_cash,
+                    difference=actual_cash - calculated_cash,
+                    is_active=False,
+                )
+                ChangeLog.capture(Shift.objects.filter(pk=active_shift.pk))
             return redirect('shift_dashboard')
 
     context = {}
     if active_shift:
-        orders = Order.objects.filter(created_at__gte=active_shift.start_time, status='completed')
-        current_sales = orders.aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
-        expenses = Expense.objects.filter(shift=active_shift)
-        current_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-        expected_cash = active_shift.opening_cash + current_sales - current_expenses
         context = {
             'shift': active_shift,
-            'current_sales': current_sales,
-            'current_expenses': current_expenses,
-            'expected_cash': expected_cash,
-            'expenses': expenses
+            'current_sales': active_shift.total_sales,
+            'current_expenses': active_shift.total_expenses,
+            'expected_cash': active_shift.expected_cash,
+            'expenses': active_shift.expenses.all()
         }
     else:
         recent_shifts = Shift.objects.filter(is_active=False).order_by('-end_time')[:5]
@@ -284,21 +532,167 @@ def shift_dashboard(request):
 
 # --- 9. DIGITAL BILL ---
 def digital_bill(request, order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-        return render(request, 'pos/digital_bill.html', {'order': order})
-    except Order.DoesNotExist:
-        return HttpResponse("Invoice not found", status=404)
+    # Shared with customers over WhatsApp and reopened often
+    return receipt_response(request, order_id, 'invoice') or HttpResponse("Invoice not found", status=404)
 
 # --- 10. CANCEL ORDER ---
-def cancel_order(request, order_id):
+async def cancel_order(request, order_id):
     try:
-        order = Order.objects.get(id=order_id)
-        order.status = 'cancelled'
-        order.save()
-        if order.table:
-            order.table.status = 'available'
-            order.table.save()
+        order = await Order.objects.aget(id=order_id)
+        await order.atransition('cancelled')
         return JsonResponse({'status': 'success'})
     except Order.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Order not found'}, status=404)
+    except InvalidTransition as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+
+# --- 11. LIVE EVENTS (SSE) ---
+@login_required(login_url='/login/')
+def event_stream(request):
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_id = None
+
+    # Under ASGI the stream is served from the event loop; under WSGI
+    # (runserver) it blocks one worker thread per open screen.
+    if isinstance(request, ASGIRequest):
+        stream = events.broker.astream(last_id)
+    else:
+        stream = events.broker.stream(last_id)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- 12. EXPORT ---
+@login_required(login_url='/login/')
+def export_orders(request):
+    fmt = request.GET.get('format', 'csv')
+    kind = request.GET.get('kind', 'items')
+    if fmt not in export.FORMATS or kind not in export.COLUMNS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown format or kind'}, status=400)
+
+    start = parse_date(request.GET.get('start'))
+    end = parse_date(request.GET.get('end'))
+    # A mistyped date must not quietly widen the export to the whole history
+    if (request.GET.get('start') and not start) or (request.GET.get('end') and not end) or (start and end and start > end):
+        return JsonResponse({'status': 'error', 'message': 'Invalid start or end date (YYYY-MM-DD)'}, status=400)
+    statuses = request.GET.getlist('status')
+    content = export.render_export(fmt, kind, start=start, end=end, statuses=statuses)
+    if isinstance(request, ASGIRequest):
+        content = export.as_async(content)
+
+    content_type, extension = export.FORMATS[fmt]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = f"bubloo-{kind}-{start or 'all'}-{end or 'all'}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# --- 13. METRICS ---
+def metrics(request):
+    # Staff can look in a browser; a Prometheus scraper sends the bearer token
+    token = settings.POS_METRICS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(auth, f'Bearer {token}')
+    )
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
+
+# --- 14. ANALYTICS ---
+@login_required(login_url='/login/')
+@read_replica
+def analytics_api(request):
+    # ?start=&end=&dimension=hour|payment_method|order_type|category|item|day[&top=10][&pivot=day]
+    end = parse_date(request.GET.get('end'), timezone.localdate())
+    start = parse_date(request.GET.get('start'), end - timedelta(days=6))
+    dimension = request.GET.get('dimension', 'day')
+    by_day = request.GET.get('pivot') == 'day'
+    try:
+        top = int(request.GET.get('top') or 0)
+    except ValueError:
+        top = -1
+    if dimension not in analytics.DIMENSIONS or start > end or top < 0 or (by_day and dimension == 'day'):
+        return JsonResponse({'status': 'error', 'message': 'Invalid range, dimension or options'}, status=400)
+    return JsonResponse(analytics.report(dimension, start, end, top=top, by_day=by_day))
+
+# --- 15. PRINT QUEUE ---
+@login_required(login_url='/login/')
+def print_queue(request):
+    return JsonResponse(printing.queue_summary())
+
+@login_required(login_url='/login/')
+def print_receipt(request, order_id):
+    # Sends the receipt to the counter printer through the queue instead of a browser popup
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    order = Order.objects.filter(id=order_id).first()
+    if order is None:
+        return JsonResponse({'status': 'error', 'message': 'Order not found'}, status=404)
+    job = PrintJob.enqueue_receipt(order)
+    return JsonResponse({'status': 'success', 'job_id': job.id})
+
+@login_required(login_url='/login/')
+def retry_print_job(request, job_id):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    if not PrintJob.objects.filter(id=job_id, status='failed').update(status='queued', attempts=0, run_after=timezone.now()):
+        return JsonResponse({'status': 'error', 'message': 'No failed job with that id'}, status=404)
+    return JsonResponse({'status': 'success'})
+
+# --- 16. BRANCH SYNC (head office) ---
+@csrf_exempt
+def sync_ingest(request):
+    # Gzipped ChangeLog batches from "manage.py sync_branch" on each branch
+    token = settings.POS_SYNC_TOKEN
+    auth = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(auth, f'Bearer {token}'):
+        return HttpResponse(status=403)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    try:
+        branch, changes = sync.decode_batch(request.body, request.headers.get('Content-Encoding', ''))
+    except (OSError, ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid batch'}, status=400)
+    return JsonResponse({'status': 'success', 'applied_through': sync.apply_batch(branch, changes)})
+
+# --- 17. CUSTOMERS ---
+@login_required(login_url='/login/')
+def customer_search(request):
+    # Takeaway form autocomplete: ?q=<start of a phone number>
+    customers = Customer.search(request.GET.get('q', ''))
+    return JsonResponse({'customers': [customer.summary() for customer in customers]})
+
+@login_required(login_url='/login/')
+@read_replica
+def customer_detail(request, customer_id):
+    customer = Customer.objects.filter(id=customer_id).first()
+    if customer is None:
+        return JsonResponse({'status': 'error', 'message': 'Customer not found'}, status=404)
+    # Through the history view, so orders past the archive horizon are listed too
+    recent = customer.history.order_by('-created_at', '-id').values('id', 'created_at', 'status', 'order_type', 'total_amount')[:20]
+    return JsonResponse({
+        **customer.summary(),
+        'orders': [
+            {**order, 'created_at': timezone.localtime(order['created_at']).isoformat(timespec='minutes'),
+             'total_amount': str(order['total_amount'])}
+            for order in recent
+        ],
+    })
+
+# --- 18. DEVICE PAIRING ---
+def pair_device(request, code):
+    # One-time link from "manage.py create_device_token"; the token itself only travels as a cookie
+    token = DeviceToken.pair(code)
+    if token is None:
+        return HttpResponse("This pairing link is unknown, already used or expired.", status=404)
+    next_url = request.GET.get('next', '/kitchen/')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = '/kitchen/'
+    response = redirect(next_url)
+    DeviceTokenMiddleware.set_cookie(response, token)
+    patch_cache_control(response, no_store=True)
+    return response